@@ -1,2 +1,3 @@
 from .portada_autonewsextractor_adaptor import AutonewsExtractorAdaptor, AutonewsExtractorAdaptorBuilder
 from .ocr_corrector import QwenOcrCorrector, QwenOcrProcessor
+from .job_queue import AbstractJobQueue, SqliteJobQueue, QueueWorker
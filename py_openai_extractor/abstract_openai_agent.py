@@ -1,6 +1,19 @@
 from abc import abstractmethod, ABC
 from openai import OpenAI
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+
+
+class RequestContext:
+    # Estado de una única petición. Se construye en cada llamada en lugar de guardarlo en el agente, de modo que un
+    # mismo agente configurado puede atender a la vez a varios hilos o tareas
+    __slots__ = ("model", "messages", "model_config")
+
+    def __init__(self, model: str = None, messages: List[Dict[str, Any]] = None,
+                 model_config: Dict[str, Any] = None):
+        self.model = model
+        self.messages = messages
+        self.model_config = model_config if model_config is not None else {}
+
 
 class AbstractOpenAiAgent:
     def __init__(self):
@@ -43,8 +56,13 @@ class AbstractOpenAiAgent:
         self._model_config.update(config)
         return self
 
+    def _new_request_context(self, model: str = None, messages: List[Dict[str, Any]] = None) -> RequestContext:
+        return RequestContext(self._model if model is None else model,
+                              getattr(self, "_messages", None) if messages is None else messages,
+                              dict(self._model_config))
+
     @abstractmethod
-    def process_request_from_client(self):
+    def process_request_from_client(self, context: Optional[RequestContext] = None):
         pass
 
 
@@ -72,8 +90,11 @@ class GenericOpenAiAgent(AbstractOpenAiAgent):
         super().__init__()
         self._fn_process_request_from_client = fn_process_request_from_client
 
-    def process_request_from_client(self, ):
-        return self._fn_process_request_from_client(self)
+    def process_request_from_client(self, context: Optional[RequestContext] = None):
+        # Las funciones escritas antes del contexto por petición sólo reciben el agente
+        if context is None:
+            return self._fn_process_request_from_client(self)
+        return self._fn_process_request_from_client(self, context)
 
 
 class BaseOpenAiCompletionsAgent(AbstractOpenAiAgent, ABC):
@@ -89,19 +110,24 @@ class BaseOpenAiCompletionsAgent(AbstractOpenAiAgent, ABC):
     def prompt(self, prompt: str):
         self._prompt = prompt
 
-    def process_request_from_client(self):
-        response = self.client.completions.create(model=self.model, prompt = self._prompt,  **self._model_config)
+    def process_request_from_client(self, context: Optional[RequestContext] = None):
+        # En este agente el prompt viaja en context.messages
+        if context is None:
+            context = self._new_request_context(messages=self._prompt)
+        response = self.client.completions.create(model=context.model, prompt=context.messages, **context.model_config)
         return response
 
 class BaseOpenAiTextChatAgent(AbstractOpenAiChatAgent, ABC):
     def __init__(self):
         super().__init__()
 
-    def process_request_from_client(self):
+    def process_request_from_client(self, context: Optional[RequestContext] = None):
+        if context is None:
+            context = self._new_request_context()
         response = self.client.chat.completions.create(
-            model=self.model,
-            messages=self.messages,
-            **self._model_config)
+            model=context.model,
+            messages=context.messages,
+            **context.model_config)
         return response
 
 
@@ -109,11 +135,13 @@ class BaseOpenAiStructuredChatAgent(AbstractOpenAiChatAgent, ABC):
     def __init__(self):
         super().__init__()
 
-    def process_request_from_client(self):
+    def process_request_from_client(self, context: Optional[RequestContext] = None):
+        if context is None:
+            context = self._new_request_context()
         response = self.client.beta.chat.completions.parse(
-            model=self.model,
-            messages=self.messages,
-            **self._model_config)
+            model=context.model,
+            messages=context.messages,
+            **context.model_config)
         return response
 
 
@@ -135,12 +163,15 @@ class BaseOpenAiEmbeddingsAgent(AbstractOpenAiAgent):
     def encoding_format(self):
         return self._encoding_format
 
-    def process_request_from_client(self):
+    def process_request_from_client(self, context: Optional[RequestContext] = None):
+        # En este agente el texto de entrada viaja en context.messages
+        if context is None:
+            context = self._new_request_context(messages=self._input)
         response = self.client.embeddings.create(
-            model=self.model,
-            input = self._input,
-            encodig_format=self._encoding_format,
-            **self._model_config)
+            model=context.model,
+            input=context.messages,
+            encoding_format=self._encoding_format,
+            **context.model_config)
         return response
 
 
@@ -0,0 +1,182 @@
+import re
+from datetime import datetime
+from typing import Dict, Any, List, Iterable, Tuple
+
+from .records import schema_root, to_builtin
+
+_JSON_TYPES = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+QUANTITY_KEY_SUFFIXES = ("quantity",)
+DATE_KEY_SUFFIXES = ("date",)
+
+
+def _key_parts(key: str) -> List[str]:
+    # cargo_quantity -> [cargo, quantity]; departureDate -> [departure, date]
+    return [p.lower() for p in re.findall(r"[A-Z]?[a-z0-9]+|[A-Z]+(?![a-z])", key)]
+
+
+class AcceptanceResult:
+    __slots__ = ("accepted", "coverage", "reasons")
+
+    def __init__(self, accepted: bool, coverage: float, reasons: List[str]):
+        self.accepted = accepted
+        self.coverage = coverage
+        self.reasons = reasons
+
+    def __repr__(self):
+        return f"AcceptanceResult(accepted={self.accepted}, coverage={self.coverage:.2f}, reasons={self.reasons!r})"
+
+
+class ExtractionAcceptanceChecker:
+    # Comprobación local (sin llamar a ningún modelo) de si una extracción es aceptable: que cumpla el esquema, que
+    # tenga rellenos suficientes campos y que las cantidades y las fechas sean razonables. La cascada de modelos la
+    # usa para decidir qué elementos se envían a un modelo más potente.
+    # La cobertura mínima de campos está desactivada por defecto: muchas noticias son escuetas y dejan a null buena
+    # parte de los campos aunque la extracción sea correcta, así que sólo se exige si se configura explícitamente.
+    # Sin quantity_keys ni date_keys, un campo es una cantidad o una fecha cuando su última palabra es "quantity" o
+    # "date" (cargo_quantity, arrival_date), no cuando sólo la contiene (candidate, update, quantity_unit).
+    def __init__(self, json_schema: Dict[str, Any] = None, min_field_coverage: float = None,
+                 quantity_keys: Iterable[str] = None, date_keys: Iterable[str] = None,
+                 date_formats: Iterable[str] = ("%Y-%m-%d", "%Y_%m_%d", "%d/%m/%Y", "%d-%m-%Y"),
+                 max_quantity: float = None, year_range: Tuple[int, int] = None):
+        self._root = schema_root(json_schema) if isinstance(json_schema, dict) else None
+        self._definitions = {}
+        if self._root is not None:
+            self._definitions.update(self._root.get("$defs", {}))
+            self._definitions.update(self._root.get("definitions", {}))
+        self._min_field_coverage = min_field_coverage
+        self._quantity_keys = set(quantity_keys) if quantity_keys is not None else None
+        self._date_keys = set(date_keys) if date_keys is not None else None
+        self._date_formats = tuple(date_formats)
+        self._max_quantity = max_quantity
+        self._year_range = tuple(year_range) if year_range is not None else None
+
+    def _is_quantity_key(self, key: str) -> bool:
+        if self._quantity_keys is not None:
+            return key in self._quantity_keys
+        parts = _key_parts(key)
+        return bool(parts) and parts[-1] in QUANTITY_KEY_SUFFIXES
+
+    def _is_date_key(self, key: str) -> bool:
+        if self._date_keys is not None:
+            return key in self._date_keys
+        parts = _key_parts(key)
+        return bool(parts) and parts[-1] in DATE_KEY_SUFFIXES
+
+    def _resolve(self, schema: Dict[str, Any]) -> Dict[str, Any]:
+        while isinstance(schema, dict) and "$ref" in schema:
+            schema = self._definitions.get(schema["$ref"].rsplit("/", 1)[-1], {})
+        return schema
+
+    def _validate(self, value: Any, schema: Dict[str, Any], path: str, errors: List[str]):
+        schema = self._resolve(schema)
+        if not isinstance(schema, dict):
+            return
+        options = schema.get("anyOf") or schema.get("oneOf")
+        if options:
+            for option in options:
+                option_errors = []
+                self._validate(value, option, path, option_errors)
+                if not option_errors:
+                    return
+            errors.append(f"{path}: no coincide con ninguna de las opciones del esquema")
+            return
+        types = schema.get("type")
+        if types is not None:
+            types = types if isinstance(types, list) else [types]
+            if not any(_JSON_TYPES.get(t, lambda v: True)(value) for t in types):
+                errors.append(f"{path}: se esperaba {'|'.join(types)}")
+                return
+        if "enum" in schema and value not in schema["enum"]:
+            errors.append(f"{path}: valor fuera de la enumeración")
+        if isinstance(value, dict):
+            properties = schema.get("properties", {})
+            for key in schema.get("required", []):
+                if key not in value:
+                    errors.append(f"{path}.{key}: falta el campo")
+            for key, item in value.items():
+                if key in properties:
+                    self._validate(item, properties[key], f"{path}.{key}", errors)
+                elif schema.get("additionalProperties") is False:
+                    errors.append(f"{path}.{key}: campo no previsto")
+        elif isinstance(value, list) and "items" in schema:
+            for index, item in enumerate(value):
+                self._validate(item, schema["items"], f"{path}[{index}]", errors)
+
+    def _coverage(self, value: Any) -> Tuple[int, int]:
+        total = filled = 0
+        if isinstance(value, dict):
+            for item in value.values():
+                total += 1
+                if item not in (None, "", [], {}):
+                    filled += 1
+                item_total, item_filled = self._coverage(item)
+                total += item_total
+                filled += item_filled
+        elif isinstance(value, list):
+            for item in value:
+                item_total, item_filled = self._coverage(item)
+                total += item_total
+                filled += item_filled
+        return total, filled
+
+    def _check_quantity(self, value: Any, path: str, errors: List[str]):
+        for quantity in value if isinstance(value, list) else [value]:
+            if quantity is None:
+                continue
+            if not _JSON_TYPES["number"](quantity):
+                errors.append(f"{path}: la cantidad no es numérica")
+            elif quantity < 0:
+                errors.append(f"{path}: cantidad negativa")
+            elif self._max_quantity is not None and quantity > self._max_quantity:
+                errors.append(f"{path}: cantidad fuera de rango")
+
+    def _check_date(self, value: Any, path: str, errors: List[str]):
+        if value is None or value == "":
+            return
+        if not isinstance(value, str):
+            errors.append(f"{path}: la fecha no es un texto")
+            return
+        for date_format in self._date_formats:
+            try:
+                date = datetime.strptime(value, date_format)
+            except ValueError:
+                continue
+            if self._year_range is not None and not self._year_range[0] <= date.year <= self._year_range[1]:
+                errors.append(f"{path}: año fuera de rango")
+            return
+        errors.append(f"{path}: fecha no reconocida")
+
+    def _check_values(self, value: Any, path: str, errors: List[str]):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                item_path = f"{path}.{key}"
+                if self._is_quantity_key(key):
+                    self._check_quantity(item, item_path, errors)
+                elif self._is_date_key(key):
+                    self._check_date(item, item_path, errors)
+                else:
+                    self._check_values(item, item_path, errors)
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                self._check_values(item, f"{path}[{index}]", errors)
+
+    def check(self, content: Any) -> AcceptanceResult:
+        content = to_builtin(content)
+        errors = []
+        if self._root is not None:
+            self._validate(content, self._root, "$", errors)
+        self._check_values(content, "$", errors)
+        total, filled = self._coverage(content)
+        coverage = filled / total if total else 0.0
+        if self._min_field_coverage is not None and coverage < self._min_field_coverage:
+            errors.append(f"$: cobertura de campos insuficiente ({coverage:.2f})")
+        return AcceptanceResult(not errors, coverage, errors)
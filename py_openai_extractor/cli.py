@@ -0,0 +1,442 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Iterator, Optional, Set
+
+from .portada_autonewsextractor_adaptor import AutonewsExtractorAdaptorBuilder
+from .ocr_corrector import QwenOcrProcessor
+from .records import json_default
+from .image_sources import IMAGE_MIME_TYPES
+from .job_queue import AbstractJobQueue, SqliteJobQueue, QueueWorker, STATE_PENDING, STATE_LEASED
+
+MODE_OCR = "ocr"
+MODE_EXTRACT = "extract"
+MODE_BOTH = "both"
+
+TEXT_EXTENSIONS = {".txt"}
+
+
+def _resolve_path(path: str, base_dir: str) -> str:
+    if os.path.isabs(path):
+        return path
+    return os.path.join(base_dir, path)
+
+
+def iter_items_from_directory(directory: str, mode: str) -> Iterator[Dict[str, Any]]:
+    extensions = TEXT_EXTENSIONS if mode == MODE_EXTRACT else set(IMAGE_MIME_TYPES)
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file_name in sorted(files):
+            if os.path.splitext(file_name)[1].lower() not in extensions:
+                continue
+            path = os.path.join(root, file_name)
+            item_id = os.path.relpath(path, directory)
+            if mode == MODE_EXTRACT:
+                yield {"id": item_id, "text_file": path}
+            else:
+                yield {"id": item_id, "images": [path]}
+
+
+def iter_items_from_manifest(manifest: str) -> Iterator[Dict[str, Any]]:
+    base_dir = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            item.setdefault("id", str(line_number))
+            item["id"] = str(item["id"])
+            if "images" in item:
+                item["images"] = [_resolve_path(p, base_dir) for p in item["images"]]
+            if "text_file" in item:
+                item["text_file"] = _resolve_path(item["text_file"], base_dir)
+            yield item
+
+
+def load_items(input_path: str, mode: str) -> List[Dict[str, Any]]:
+    if os.path.isdir(input_path):
+        return list(iter_items_from_directory(input_path, mode))
+    return list(iter_items_from_manifest(input_path))
+
+
+def _is_failed_record(record: Dict[str, Any]) -> bool:
+    if "error" in record:
+        return True
+    extraction = record.get("extraction")
+    return isinstance(extraction, dict) and extraction.get("status", 0) < 0
+
+
+def _record_failure(record: Dict[str, Any]) -> Optional[str]:
+    if not _is_failed_record(record):
+        return None
+    if "error" in record:
+        return record["error"]
+    return record["extraction"].get("error_message", "Error de extracción")
+
+
+def load_checkpoint(output_path: str, retry_failed: bool = False) -> Set[str]:
+    # El propio fichero de salida hace de checkpoint: cada resultado se escribe y sincroniza con disco antes de
+    # contarlo como hecho, por lo que al reanudar una ejecución interrumpida no se vuelve a facturar ningún elemento.
+    # Los resultados nuevos (p. ej. los reintentos de --retry-failed) se añaden al final, así que un mismo id puede
+    # aparecer en varias líneas: vale siempre la última.
+    last_failed = {}
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Última línea truncada por una interrupción
+                continue
+            last_failed[record["id"]] = _is_failed_record(record)
+    return {item_id for item_id, failed in last_failed.items() if not (retry_failed and failed)}
+
+
+class JsonlResultWriter:
+    def __init__(self, output_path: str):
+        self._lock = threading.Lock()
+        needs_newline = os.path.exists(output_path) and os.path.getsize(output_path) > 0
+        if needs_newline:
+            with open(output_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b"\n"
+        self._file = open(output_path, "a", encoding="utf-8")
+        if needs_newline:
+            self._file.write("\n")
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False, default=json_default)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class ProgressReporter:
+    def __init__(self, total: int, interval: float = 5.0, stream=sys.stderr, fn_remaining=None):
+        self._total = total
+        self._fn_remaining = fn_remaining
+        self._interval = interval
+        self._stream = stream
+        self._done = 0
+        self._failed = 0
+        self._start = time.monotonic()
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, failed: bool = False):
+        with self._lock:
+            self._done += 1
+            if failed:
+                self._failed += 1
+            now = time.monotonic()
+            if now - self._last_report >= self._interval or self._done == self._total:
+                self._last_report = now
+                self._report(now)
+
+    def _report(self, now: float):
+        if self._fn_remaining is not None:
+            # Con una cola compartida el total cambia a medida que otros nodos añaden o terminan elementos
+            remaining = self._fn_remaining()
+            if remaining is not None:
+                self._total = self._done + remaining
+        elapsed = now - self._start
+        rate = self._done / elapsed if elapsed > 0 else 0.0
+        remaining = self._total - self._done
+        eta = _format_seconds(remaining / rate) if rate > 0 else "?"
+        self._stream.write(f"[{self._done}/{self._total}] {rate:.2f} elementos/s, errores: {self._failed}, "
+                           f"tiempo restante estimado: {eta}\n")
+        self._stream.flush()
+
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+class ItemProcessor:
+    def __init__(self, mode: str, config_json: Dict[str, Any], api_key: Optional[str] = None,
+                 ocr_api_key: Optional[str] = None):
+        self._mode = mode
+        self._config_json = config_json
+        self._api_key = api_key
+        self._ocr_api_key = ocr_api_key
+        self._lock = threading.Lock()
+        self._extractor = None
+        self._ocr_processor = None
+
+    def _get_extractor(self):
+        # Los agentes no guardan estado de cada petición, así que un único agente (y su cliente) atiende a todos los
+        # hilos
+        with self._lock:
+            if self._extractor is None:
+                self._extractor = AutonewsExtractorAdaptorBuilder().with_api_key(self._api_key) \
+                    .with_config_json(self._config_json) \
+                    .build()
+            return self._extractor
+
+    @property
+    def cascade_stats(self):
+        return self._extractor.cascade_stats if self._extractor is not None else None
+
+    @property
+    def key_aliasing_stats(self):
+        return self._extractor.key_aliasing_stats if self._extractor is not None else None
+
+    def _get_ocr_processor(self):
+        with self._lock:
+            if self._ocr_processor is None:
+                ocr_config = self._config_json.get("ocr", {})
+                processor = QwenOcrProcessor().set_api_key(self._ocr_api_key)
+                if "model" in ocr_config:
+                    processor.set_model(ocr_config["model"])
+                if "model_config" in ocr_config:
+                    processor.set_model_config(ocr_config["model_config"])
+                processor.set_messages_config(ocr_config.get("system_message"), ocr_config.get("user_message"))
+                self._ocr_processor = processor
+            return self._ocr_processor
+
+    def _get_text(self, item: Dict[str, Any]) -> str:
+        if "text" in item:
+            return item["text"]
+        with open(item["text_file"], encoding="utf-8") as f:
+            return f.read()
+
+    @property
+    def batch_size(self) -> int:
+        # Con el empaquetado activado se entregan al extractor varios textos a la vez para que pueda agruparlos
+        if self._mode != MODE_EXTRACT:
+            return 1
+        return self._get_extractor().packing_max_items
+
+    def process_batch(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if len(items) == 1:
+            return [self.process(items[0])]
+        records = []
+        texts = []
+        to_extract = []
+        for item in items:
+            record = {"id": item["id"], "mode": self._mode}
+            records.append(record)
+            try:
+                texts.append(self._get_text(item))
+                to_extract.append(record)
+            except Exception as e:
+                record["error"] = str(e)
+        start = time.monotonic()
+        try:
+            for record, extraction in zip(to_extract, self._get_extractor().extract_data_list(texts)):
+                record["extraction"] = extraction
+        except Exception as e:
+            for record in to_extract:
+                record["error"] = str(e)
+        elapsed = round((time.monotonic() - start) / max(len(to_extract), 1), 3)
+        for record in records:
+            record["elapsed"] = elapsed
+        return records
+
+    def process(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        record = {"id": item["id"], "mode": self._mode}
+        start = time.monotonic()
+        try:
+            if self._mode in (MODE_OCR, MODE_BOTH):
+                text = self._get_ocr_processor().getTextFromImage([os.path.abspath(p) for p in item["images"]])
+                record["ocr_text"] = text
+            else:
+                text = self._get_text(item)
+            if self._mode in (MODE_EXTRACT, MODE_BOTH):
+                record["extraction"] = self._get_extractor().extract_data(text)
+        except Exception as e:
+            record["error"] = str(e)
+        record["elapsed"] = round(time.monotonic() - start, 3)
+        return record
+
+
+def run(items: List[Dict[str, Any]], processor: ItemProcessor, writer: JsonlResultWriter, workers: int = 4,
+        progress_interval: float = 5.0) -> Dict[str, int]:
+    progress = ProgressReporter(len(items), progress_interval)
+    counters = {"processed": 0, "failed": 0}
+    pending = set()
+    batch_size = processor.batch_size
+    batches = (items[i:i + batch_size] for i in range(0, len(items), batch_size))
+
+    def _collect(finished):
+        for future in finished:
+            for record in future.result():
+                writer.write(record)
+                failed = _is_failed_record(record)
+                counters["processed"] += 1
+                if failed:
+                    counters["failed"] += 1
+                progress.update(failed)
+            # Sólo sale de pending cuando todos sus resultados están escritos
+            pending.discard(future)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            # Se limita el número de peticiones en curso para no cargar todo el lote en memoria
+            for batch in batches:
+                pending.add(executor.submit(processor.process_batch, batch))
+                if len(pending) >= workers * 2:
+                    _collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            while pending:
+                _collect(wait(pending, return_when=FIRST_COMPLETED).done)
+        except KeyboardInterrupt:
+            # Las peticiones ya enviadas se facturan igualmente: se espera a que terminen y se guardan
+            for future in list(pending):
+                future.cancel()
+            _collect(wait([f for f in pending if not f.cancelled()]).done)
+            raise
+    return counters
+
+
+def run_from_queue(queue: AbstractJobQueue, processor: ItemProcessor, writer: JsonlResultWriter, workers: int = 4,
+                   progress_interval: float = 5.0) -> Dict[str, int]:
+    def _remaining():
+        try:
+            stats = queue.stats()
+        except queue.transient_errors:
+            # El informe de progreso no debe detener al trabajador; se mantiene el último total conocido
+            return None
+        return stats[STATE_PENDING] + stats[STATE_LEASED]
+
+    progress = ProgressReporter(_remaining() or 0, progress_interval, fn_remaining=_remaining)
+    counters = {"processed": 0, "failed": 0, "worker_errors": 0}
+    lock = threading.Lock()
+
+    def _on_result(job, record):
+        failed = _is_failed_record(record)
+        # Los intentos fallidos que aún se reintentarán no se escriben; sólo el resultado definitivo
+        if failed and job.attempts < queue.max_attempts:
+            return
+        writer.write(record)
+        with lock:
+            counters["processed"] += 1
+            if failed:
+                counters["failed"] += 1
+        progress.update(failed)
+
+    def _run_worker(worker):
+        try:
+            worker.run(on_result=_on_result)
+        except Exception as e:
+            # Los elementos que tenía el trabajador vuelven a la cola cuando caduca su arrendamiento
+            print(f"El trabajador {worker.worker_id} se ha detenido por un error: {e}", file=sys.stderr)
+            with lock:
+                counters["worker_errors"] += 1
+
+    queue_workers = [QueueWorker(queue, processor.process, _record_failure) for _ in range(workers)]
+    threads = [threading.Thread(target=_run_worker, args=(worker,), daemon=True) for worker in queue_workers]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1.0)
+    except KeyboardInterrupt:
+        # Los elementos en curso terminan y se guardan; los demás quedan en la cola para otro trabajador
+        for worker in queue_workers:
+            worker.stop()
+        for thread in threads:
+            thread.join()
+        raise
+    return counters
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="portada-openai-extractor",
+        description="Procesa por lotes imágenes (OCR) y textos (extracción) guardando los resultados en JSONL.")
+    parser.add_argument("input", nargs="?",
+                        help="Directorio de imágenes o textos, o manifiesto JSONL con los elementos. Con --queue es "
+                             "opcional: si se indica, sus elementos se añaden a la cola")
+    parser.add_argument("-c", "--config", required=True, help="Fichero config_json del extractor")
+    parser.add_argument("-o", "--output", required=True, help="Fichero JSONL de resultados (también hace de checkpoint)")
+    parser.add_argument("-m", "--mode", choices=[MODE_OCR, MODE_EXTRACT, MODE_BOTH], default=MODE_EXTRACT)
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Número de peticiones en paralelo")
+    parser.add_argument("--api-key", default=os.environ.get("PORTADA_EXTRACTOR_API_KEY"),
+                        help="Clave del API de extracción (por defecto PORTADA_EXTRACTOR_API_KEY)")
+    parser.add_argument("--ocr-api-key", default=os.environ.get("PORTADA_OCR_API_KEY"),
+                        help="Clave del API de OCR (por defecto PORTADA_OCR_API_KEY)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Vuelve a procesar los elementos que terminaron con error en ejecuciones anteriores. "
+                             "El nuevo resultado se añade al final del fichero de salida; si un id aparece en varias "
+                             "líneas, vale la última")
+    parser.add_argument("--progress-interval", type=float, default=5.0,
+                        help="Segundos entre informes de progreso")
+    parser.add_argument("--queue",
+                        help="Base de datos SQLite (en un sistema de ficheros compartido) con la cola de trabajo "
+                             "común a varios procesos o máquinas")
+    parser.add_argument("--max-attempts", type=int, default=3,
+                        help="Intentos por elemento antes de pasarlo a la lista de fallidos de la cola")
+    parser.add_argument("--lease-seconds", type=float, default=300,
+                        help="Duración del arrendamiento de un elemento de la cola sin latido")
+    parser.add_argument("--requeue-dead", action="store_true",
+                        help="Devuelve a la cola los elementos de la lista de fallidos")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    if args.mode in (MODE_EXTRACT, MODE_BOTH) and not args.api_key:
+        print("Falta la clave del API de extracción (--api-key)", file=sys.stderr)
+        return 2
+    if args.mode in (MODE_OCR, MODE_BOTH) and not args.ocr_api_key:
+        print("Falta la clave del API de OCR (--ocr-api-key)", file=sys.stderr)
+        return 2
+
+    with open(args.config, encoding="utf-8") as f:
+        config_json = json.load(f)
+
+    processor = ItemProcessor(args.mode, config_json, args.api_key, args.ocr_api_key)
+    if args.queue is not None:
+        queue = SqliteJobQueue(args.queue, args.max_attempts, args.lease_seconds)
+        if args.requeue_dead:
+            print(f"{queue.requeue_dead_letters()} elementos devueltos a la cola", file=sys.stderr)
+        if args.input is not None:
+            added = queue.add(load_items(args.input, args.mode))
+            print(f"{added} elementos nuevos añadidos a la cola", file=sys.stderr)
+        print(f"Estado de la cola: {queue.stats()}", file=sys.stderr)
+        runner = lambda writer: run_from_queue(queue, processor, writer, args.workers, args.progress_interval)
+    elif args.input is None:
+        print("Hay que indicar la entrada o una cola (--queue)", file=sys.stderr)
+        return 2
+    else:
+        done = load_checkpoint(args.output, args.retry_failed)
+        items = [item for item in load_items(args.input, args.mode) if item["id"] not in done]
+        print(f"{len(done)} elementos ya procesados, {len(items)} pendientes", file=sys.stderr)
+        runner = lambda writer: run(items, processor, writer, args.workers, args.progress_interval)
+
+    writer = JsonlResultWriter(args.output)
+    try:
+        counters = runner(writer)
+    except KeyboardInterrupt:
+        print("Interrumpido. Vuelve a ejecutar la misma orden para reanudar.", file=sys.stderr)
+        return 130
+    finally:
+        writer.close()
+    print(f"Procesados {counters['processed']} elementos, {counters['failed']} con error", file=sys.stderr)
+    if counters.get("worker_errors"):
+        print(f"{counters['worker_errors']} trabajadores se detuvieron por un error; vuelve a ejecutar la orden para "
+              f"procesar los elementos que quedan en la cola", file=sys.stderr)
+    if processor.cascade_stats:
+        for model, stats in processor.cascade_stats.items():
+            rate = "-" if stats["acceptance_rate"] is None else f"{stats['acceptance_rate']:.1%}"
+            print(f"Cascada {model}: {stats['accepted']}/{stats['attempts']} aceptados ({rate})", file=sys.stderr)
+    if processor.key_aliasing_stats:
+        stats = processor.key_aliasing_stats
+        ratio = "-" if stats["estimated_saving_ratio"] is None else f"{stats['estimated_saving_ratio']:.1%}"
+        print(f"Alias de claves: unos {stats['estimated_output_tokens_saved']} tokens de salida ahorrados en "
+              f"{stats['responses']} respuestas ({ratio})", file=sys.stderr)
+    return 0 if counters["failed"] == 0 and not counters.get("worker_errors") else 1
@@ -3,10 +3,28 @@
 # from babel.messages.extract import extract
 # from openai import OpenAI
 import json
+import threading
 from typing import Dict, Any, Optional, List, Union
 from datetime import datetime, timedelta
 from babel.dates import format_date
-from .abstract_openai_agent import AbstractOpenAiChatAgent
+from .abstract_openai_agent import AbstractOpenAiChatAgent, RequestContext
+from .records import Record, RecordFactory, RESULT_MODE_DICT, RESULT_MODE_RECORDS, schema_root
+from .acceptance import ExtractionAcceptanceChecker
+from .key_aliases import KeyAliaser
+
+PACKING_INSTRUCTIONS = ("Se proporcionan varios textos independientes, cada uno precedido por su identificador entre "
+                        "corchetes. Extrae la información de cada texto por separado y devuelve en 'items' un "
+                        "elemento por texto, con su identificador en 'item_id' y la información extraída en "
+                        "'result'.")
+PACKING_KEYS = ("items", "item_id", "result")
+CHARS_PER_TOKEN = 4
+# La plantilla sólo tiene un elemento de cada lista (p. ej. cargo_list); la respuesta real suele ser más larga
+PACKING_OUTPUT_FACTOR = 2
+
+
+def estimate_tokens(text: str) -> int:
+    # Aproximación habitual de unos 4 caracteres por token; basta para repartir los textos entre peticiones
+    return len(text) // CHARS_PER_TOKEN + 1
 
 
 class InfoExtractor(AbstractOpenAiChatAgent):
@@ -18,13 +36,194 @@ class InfoExtractor(AbstractOpenAiChatAgent):
         self._field_definitions = {}
         self._json_template = {}
         self._examples = ""
+        self._result_mode = RESULT_MODE_DICT
+        self._record_factory = None
+        self._record_factory_lock = threading.Lock()
+        self._packing_token_budget = None
+        self._packing_max_items = 20
+        self._packing_output_tokens_per_item = None
+        self._model_cascade = []
+        self._acceptance_checker = None
+        self._cascade_stats = {}
+        self._cascade_stats_lock = threading.Lock()
+        self._key_aliasing = False
+        self._aliased_prompt = None
+        self._aliased_prompt_lock = threading.Lock()
+        self._key_aliasing_stats = {"responses": 0, "output_chars_saved": 0, "completion_tokens": 0}
+        self._key_aliasing_stats_lock = threading.Lock()
+
+    @property
+    def result_mode(self):
+        return self._result_mode
+
+    @property
+    def packing_max_items(self):
+        return self._packing_max_items
+
+    @property
+    def packing_enabled(self):
+        return self._packing_token_budget is not None and isinstance(self._json_schema, dict)
 
     def set_json_schema(self, json_schema: Dict[str, Any]) -> 'InfoExtractor':
         self._json_schema = json_schema
+        self._record_factory = None
+        self._aliased_prompt = None
+        return self
+
+    def set_key_aliasing(self, enabled: bool = True) -> 'InfoExtractor':
+        # El modelo ve y genera alias cortos de las claves del esquema; se expanden a las claves completas al
+        # decodificar la respuesta
+        self._key_aliasing = enabled
+        self._aliased_prompt = None
+        return self
+
+    @property
+    def key_aliasing_enabled(self):
+        return self._key_aliasing and isinstance(self._json_schema, dict)
+
+    @property
+    def key_aliasing_stats(self) -> Dict[str, Any]:
+        with self._key_aliasing_stats_lock:
+            stats = dict(self._key_aliasing_stats)
+        stats["estimated_output_tokens_saved"] = stats["output_chars_saved"] // CHARS_PER_TOKEN
+        total = stats["completion_tokens"] + stats["estimated_output_tokens_saved"]
+        stats["estimated_saving_ratio"] = stats["estimated_output_tokens_saved"] / total if total else None
+        return stats
+
+    def _get_aliased_prompt(self) -> Optional[Dict[str, Any]]:
+        if not self.key_aliasing_enabled:
+            return None
+        with self._aliased_prompt_lock:
+            if self._aliased_prompt is None:
+                aliaser = KeyAliaser(self._json_schema, self._json_template, PACKING_KEYS)
+                self._aliased_prompt = {
+                    "aliaser": aliaser,
+                    "json_schema": aliaser.alias_schema(self._json_schema),
+                    "json_template": aliaser.alias_value(self._json_template),
+                    "field_definitions": aliaser.alias_field_definitions(self._field_definitions),
+                    "examples": aliaser.alias_text(self._examples),
+                }
+            return self._aliased_prompt
+
+    def _prompt_value(self, name: str) -> Any:
+        aliased_prompt = self._get_aliased_prompt()
+        if aliased_prompt is None:
+            return getattr(self, "_" + name)
+        return aliased_prompt[name]
+
+    def _record_key_aliasing_savings(self, chars_saved: int, usage: Any):
+        with self._key_aliasing_stats_lock:
+            self._key_aliasing_stats["responses"] += 1
+            self._key_aliasing_stats["output_chars_saved"] += chars_saved
+            completion_tokens = getattr(usage, "completion_tokens", None)
+            if completion_tokens:
+                self._key_aliasing_stats["completion_tokens"] += completion_tokens
+
+    def set_result_mode(self, result_mode: str) -> 'InfoExtractor':
+        if result_mode not in (RESULT_MODE_DICT, RESULT_MODE_RECORDS):
+            raise ValueError(f"Modo de resultado desconocido: {result_mode}")
+        self._result_mode = result_mode
         return self
 
+    def _get_record_factory(self) -> RecordFactory:
+        with self._record_factory_lock:
+            if self._record_factory is None:
+                self._record_factory = RecordFactory(self._json_schema)
+            return self._record_factory
+
+    def _decode_content(self, message, usage: Any = None) -> Any:
+        # Si el SDK ya ha devuelto el objeto analizado (beta.chat.completions.parse) se reutiliza en lugar de volver
+        # a decodificar message.content
+        parsed = getattr(message, "parsed", None)
+        aliased_prompt = self._get_aliased_prompt()
+        if aliased_prompt is not None:
+            return self._decode_aliased_content(message, parsed, aliased_prompt["aliaser"], usage)
+        if parsed is not None:
+            if self._result_mode == RESULT_MODE_RECORDS:
+                return self._get_record_factory().from_obj(
+                    parsed.model_dump() if hasattr(parsed, "model_dump") else parsed)
+            return parsed.model_dump() if hasattr(parsed, "model_dump") else parsed
+        if self._result_mode == RESULT_MODE_RECORDS:
+            return self._get_record_factory().decode(message.content)
+        return json.loads(message.content)
+
+    def _decode_aliased_content(self, message, parsed: Any, aliaser: KeyAliaser, usage: Any) -> Any:
+        saved = []
+        if parsed is not None:
+            content = self._convert_result(aliaser.expand(parsed, saved.append))
+        elif self._result_mode == RESULT_MODE_RECORDS:
+            # Se expanden los alias y se construyen los registros en la misma pasada del decodificador
+            record_factory = self._get_record_factory()
+            content = json.loads(message.content, object_hook=lambda obj: record_factory.object_hook(
+                aliaser.expand_object(obj, saved.append)))
+        else:
+            content = json.loads(message.content, object_hook=lambda obj: aliaser.expand_object(obj, saved.append))
+        self._record_key_aliasing_savings(sum(saved), usage)
+        return content
+
+    def set_packing(self, token_budget: Optional[int], max_items: int = 20,
+                    output_tokens_per_item: int = None) -> 'InfoExtractor':
+        # token_budget es el máximo de tokens (estimados) de texto de entrada que se agrupan en una misma petición.
+        # Con None se desactiva el empaquetado. La respuesta también crece con cada texto, así que si model_config
+        # tiene max_tokens tampoco se agrupan más textos de los que caben en la salida (output_tokens_per_item por
+        # texto; por defecto se estima a partir de json_template)
+        self._packing_token_budget = token_budget
+        self._packing_max_items = max_items
+        self._packing_output_tokens_per_item = output_tokens_per_item
+        return self
+
+    def _packing_output_limit(self) -> int:
+        max_tokens = self._model_config.get("max_tokens") or self._model_config.get("max_completion_tokens")
+        if not max_tokens:
+            return self._packing_max_items
+        per_item = self._packing_output_tokens_per_item
+        if per_item is None:
+            template = {"item_id": "00", "result": self._prompt_value("json_template")}
+            per_item = estimate_tokens(json.dumps(template, ensure_ascii=False)) * PACKING_OUTPUT_FACTOR
+        return max(1, min(self._packing_max_items, max_tokens // per_item))
+
+    def set_model_cascade(self, models: Optional[List[str]],
+                          acceptance_checker: ExtractionAcceptanceChecker = None) -> 'InfoExtractor':
+        # Los modelos se ordenan de más barato a más potente. Cada texto se envía al primero y sólo se pasa al
+        # siguiente si la comprobación local de aceptación rechaza el resultado. Con la cascada activa no se usan ni
+        # el modelo del extractor ni el modelo de respaldo: si se quieren usar, hay que incluirlos en la lista
+        self._model_cascade = list(models) if models else []
+        self._acceptance_checker = acceptance_checker
+        with self._cascade_stats_lock:
+            self._cascade_stats = {model: {"attempts": 0, "accepted": 0} for model in self._model_cascade}
+        return self
+
+    @property
+    def model_cascade(self):
+        return self._model_cascade
+
+    @property
+    def cascade_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._cascade_stats_lock:
+            stats = {}
+            for model, counters in self._cascade_stats.items():
+                stats[model] = dict(counters)
+                stats[model]["acceptance_rate"] = \
+                    counters["accepted"] / counters["attempts"] if counters["attempts"] else None
+            return stats
+
+    def _get_acceptance_checker(self) -> ExtractionAcceptanceChecker:
+        if self._acceptance_checker is None:
+            self._acceptance_checker = ExtractionAcceptanceChecker(self._json_schema)
+        return self._acceptance_checker
+
+    def _accept(self, model: str, resp: Dict[str, Any]) -> bool:
+        accepted = resp["status"] == 0 and self._get_acceptance_checker().check(resp["content"]).accepted
+        with self._cascade_stats_lock:
+            counters = self._cascade_stats.setdefault(model, {"attempts": 0, "accepted": 0})
+            counters["attempts"] += 1
+            if accepted:
+                counters["accepted"] += 1
+        return accepted
+
     def set_field_definitions(self, field_definitions: Dict[str, str]) -> 'InfoExtractor':
         self._field_definitions = field_definitions
+        self._aliased_prompt = None
         return self
 
     def set_messages_config(self, messages_config: Dict[str, Any]) -> 'InfoExtractor':
@@ -33,22 +232,26 @@ class InfoExtractor(AbstractOpenAiChatAgent):
 
     def set_json_template(self, json_template: Dict[str, Any]) -> 'InfoExtractor':
         self._json_template = json_template
+        self._aliased_prompt = None
         return self
 
     def set_examples(self, examples: str) -> 'InfoExtractor':
         self._examples = examples
+        self._aliased_prompt = None
         return self
 
-    def _create_messages(self, texto_entrada: str) -> List[Dict[str, str]]:
+    def _create_messages(self, texto_entrada: str, json_template: Any = None) -> List[Dict[str, str]]:
+        if json_template is None:
+            json_template = self._prompt_value("json_template")
         field_definitions_text = '. '.join([
             f"'{key}': '{value}'"
-            for key, value in self._field_definitions.items()
+            for key, value in self._prompt_value("field_definitions").items()
         ])
 
         user_message = self._messages_config["template"]["content"].format(
-            json_template=json.dumps(self._json_template, ensure_ascii=False),
+            json_template=json.dumps(json_template, ensure_ascii=False),
             field_definitions=field_definitions_text,
-            input_example=self._examples,
+            input_example=self._prompt_value("examples"),
             input_text=texto_entrada
         )
 
@@ -57,13 +260,15 @@ class InfoExtractor(AbstractOpenAiChatAgent):
             {"role": "user", "content": user_message}
         ]
 
-    def process_request_from_client(self):
+    def process_request_from_client(self, context: Optional[RequestContext] = None, response_format: Any = None):
+        if context is None:
+            context = self._new_request_context()
         respuesta = self.client.chat.completions.create(
-            model=self.model,
+            model=context.model,
             # messages=self._create_messages(texto),
-            messages=self.messages,
-            response_format=self._json_schema,
-            **self._model_config
+            messages=context.messages,
+            response_format=self._prompt_value("json_schema") if response_format is None else response_format,
+            **context.model_config
         )
         return respuesta
 
@@ -71,10 +276,16 @@ class InfoExtractor(AbstractOpenAiChatAgent):
     def extraer_informacion(self, texto: str) -> Union[Dict[str, Any], str, None]:
         if not all([self._client, self._model, self._json_schema]):
             raise ValueError("La configuración del extractor está incompleta.")
-        if self._fallback_model is None:
-            models_to_try = [self._model]
+        if self._model_cascade:
+            return self._extraer_informacion_en_cascada(texto)
+        return self._extraer_informacion_con_modelo(texto, self._model, self._fallback_model)
+
+    def _extraer_informacion_con_modelo(self, texto: str, model: str, fallback_model: Optional[str]) \
+            -> Union[Dict[str, Any], str, None]:
+        if fallback_model is None:
+            models_to_try = [model]
         else:
-            models_to_try = [self._model, self._fallback_model]
+            models_to_try = [model, fallback_model]
 
         last_raw_content = None
 
@@ -85,25 +296,26 @@ class InfoExtractor(AbstractOpenAiChatAgent):
             else:
                 break
             try:
-                self.model = model
-                self.messages = self._create_messages(texto)
-                respuesta = self.process_request_from_client()
-                contenido_respuesta = respuesta.choices[0].message.content
+                context = self._new_request_context(model, self._create_messages(texto))
+                respuesta = self.process_request_from_client(context)
+                mensaje = respuesta.choices[0].message
+                contenido_respuesta = mensaje.content
                 last_raw_content = contenido_respuesta
                 try:
-                    resp = {"status": 0, "json_type": True, "content": json.loads(contenido_respuesta)}
+                    resp = {"status": 0, "json_type": True,
+                            "content": self._decode_content(mensaje, getattr(respuesta, "usage", None))}
                 except json.JSONDecodeError:
                     msg = f"No se pudo decodificar la respuesta como JSON usando el modelo {model}."
                     print(msg)
-                    if model == self._fallback_model:
+                    if model == fallback_model or fallback_model is None:
                         message = f"{msg}. Fallaron todos los intentos de extracción JSON. Se devuelve el contenido crudo."
                         resp = {"status": -1, "json_type": False, "content": contenido_respuesta, "error_message": message}
                     else:
-                        print(f"Intentando con el modelo de respaldo: {self._fallback_model}")
+                        print(f"Intentando con el modelo de respaldo: {fallback_model}")
                         try_a_new_time = True
             except Exception as e:
                 print(f"Error al procesar la entrada con el modelo {model}: {str(e)}")
-                if model == self._fallback_model:
+                if model == fallback_model:
                     message = "Fallaron todos los intentos de extracción."
                     if last_raw_content:
                         message = f"{message}. Devolviendo el último contenido crudo obtenido, con el siguiente error: '{msg}'."
@@ -112,8 +324,8 @@ class InfoExtractor(AbstractOpenAiChatAgent):
                         last_msg = str(e)
                         message = f"No se pudo obtener ningún contenido. Se ha intentado com los modelos {models_to_try} sin éxito. El último error ha sido(. Se devuelve None"
                         resp = {"status": -3, "json_type": False, "content": None, "error_message": message}
-                elif self._fallback_model is not None:
-                    print(f"Intentando con el modelo de respaldo: {self._fallback_model}")
+                elif fallback_model is not None:
+                    print(f"Intentando con el modelo de respaldo: {fallback_model}")
                     try_a_new_time = True
                 else:
                     message = (f"Se produjo un error procesando el contenido con el modelo {model}.Se ha devuelto la siguiente información: {str(e)}")
@@ -121,6 +333,162 @@ class InfoExtractor(AbstractOpenAiChatAgent):
 
         return resp  # Este return solo se alcanzará si hay un error inesperado en la lógica del bucle
 
+    def _extraer_informacion_en_cascada(self, texto: str, first_tier: int = 0) -> Union[Dict[str, Any], str, None]:
+        resp = None
+        best_resp = None
+        for tier in range(first_tier, len(self._model_cascade)):
+            model = self._model_cascade[tier]
+            resp = self._extraer_informacion_con_modelo(texto, model, None)
+            resp["model"] = model
+            resp["cascade_tier"] = tier
+            if self._accept(model, resp):
+                resp["accepted"] = True
+                return resp
+            resp["accepted"] = False
+            if resp["status"] == 0:
+                best_resp = resp
+            if tier < len(self._model_cascade) - 1:
+                print(f"Resultado no aceptado con el modelo {model}. Se pasa al modelo {self._model_cascade[tier + 1]}")
+        # Ningún modelo ha dado un resultado aceptable: se devuelve el último JSON válido obtenido, si lo hay
+        return best_resp if best_resp is not None else resp
+
+    def _packed_json_schema(self) -> Dict[str, Any]:
+        json_schema_base = self._prompt_value("json_schema")
+        root = schema_root(json_schema_base)
+        item_schema = {k: v for k, v in root.items() if k not in ("$defs", "definitions")}
+        packed_root = {
+            "type": "object",
+            "properties": {
+                "items": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "item_id": {"type": "string"},
+                            "result": item_schema
+                        },
+                        "required": ["item_id", "result"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["items"],
+            "additionalProperties": False
+        }
+        # Las definiciones se mantienen en la raíz para que las referencias "#/$defs/..." sigan siendo válidas
+        for key in ("$defs", "definitions"):
+            if key in root:
+                packed_root[key] = root[key]
+        if "json_schema" not in json_schema_base:
+            return packed_root
+        json_schema = dict(json_schema_base["json_schema"])
+        json_schema["name"] = json_schema.get("name", "extraction") + "_batch"
+        json_schema["schema"] = packed_root
+        packed = dict(json_schema_base)
+        packed["json_schema"] = json_schema
+        return packed
+
+    def _group_for_packing(self, textos: List[str]) -> List[List[int]]:
+        groups = []
+        current = []
+        current_tokens = 0
+        max_items = self._packing_output_limit()
+        for index, texto in enumerate(textos):
+            tokens = estimate_tokens(texto)
+            if tokens > self._packing_token_budget:
+                # Los textos largos no se benefician del empaquetado
+                groups.append([index])
+                continue
+            if current and (current_tokens + tokens > self._packing_token_budget
+                            or len(current) >= max_items):
+                groups.append(current)
+                current = []
+                current_tokens = 0
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def _convert_result(self, result: Any) -> Any:
+        if self._result_mode == RESULT_MODE_RECORDS:
+            return self._get_record_factory().from_obj(result)
+        return result
+
+    def _extraer_informacion_empaquetada(self, textos: List[str], indices: List[int]) \
+            -> Optional[Dict[int, Dict[str, Any]]]:
+        # Devuelve los resultados de los textos que se han podido extraer; el resto se reintenta por separado. Si la
+        # respuesta no es un JSON válido (normalmente porque se ha cortado al llegar a max_tokens) devuelve None
+        ids = [str(i) for i in range(len(indices))]
+        input_text = PACKING_INSTRUCTIONS + "\n\n" + "\n\n".join(
+            f"[{item_id}]\n{textos[index]}" for item_id, index in zip(ids, indices))
+        json_template = {"items": [{"item_id": "<id>", "result": self._prompt_value("json_template")}]}
+        try:
+            context = self._new_request_context(self._packing_model(),
+                                                self._create_messages(input_text, json_template))
+            respuesta = self.process_request_from_client(context, self._packed_json_schema())
+            # Se decodifica igual que una respuesta individual (objeto analizado, registros y alias); las claves del
+            # envoltorio del lote no tienen alias ni registro propio
+            data = self._decode_content(respuesta.choices[0].message, getattr(respuesta, "usage", None))
+        except json.JSONDecodeError as e:
+            print(f"Respuesta incompleta para un lote de {len(indices)} textos con el modelo {self._packing_model()}: "
+                  f"{str(e)}")
+            return None
+        except Exception as e:
+            print(f"Error al procesar un lote de {len(indices)} textos con el modelo {self._packing_model()}: {str(e)}")
+            return {}
+        results = {}
+        items = data.get("items") if isinstance(data, (dict, Record)) else None
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, (dict, Record)) or not isinstance(item.get("result"), (dict, Record)):
+                continue
+            item_id = str(item.get("item_id"))
+            if item_id not in ids or indices[ids.index(item_id)] in results:
+                continue
+            resp = {"status": 0, "json_type": True, "content": self._convert_result(item["result"])}
+            if self._model_cascade:
+                # Con cascada, los resultados del lote también pasan la comprobación de aceptación del primer modelo
+                model = self._model_cascade[0]
+                resp.update({"model": model, "cascade_tier": 0, "accepted": self._accept(model, resp)})
+            results[indices[ids.index(item_id)]] = resp
+        return results
+
+    def _extraer_informacion_empaquetada_o_dividida(self, textos: List[str], indices: List[int]) \
+            -> Dict[int, Dict[str, Any]]:
+        packed = self._extraer_informacion_empaquetada(textos, indices)
+        if packed is not None:
+            return packed
+        # Con una respuesta cortada se prueba con dos lotes de la mitad antes de enviar cada texto por separado
+        packed = {}
+        half = len(indices) // 2
+        for part in (indices[:half], indices[half:]):
+            if len(part) > 1:
+                packed.update(self._extraer_informacion_empaquetada_o_dividida(textos, part))
+        return packed
+
+    def _packing_model(self) -> str:
+        return self._model_cascade[0] if self._model_cascade else self._model
+
+    def extraer_informacion_lote(self, textos: List[str]) -> List[Union[Dict[str, Any], str, None]]:
+        if not self.packing_enabled:
+            return [self.extraer_informacion(texto) for texto in textos]
+        if not all([self._client, self._model, self._json_schema]):
+            raise ValueError("La configuración del extractor está incompleta.")
+        resps = [None] * len(textos)
+        for indices in self._group_for_packing(textos):
+            packed = self._extraer_informacion_empaquetada_o_dividida(textos, indices) if len(indices) > 1 else {}
+            for index in indices:
+                resp = packed.get(index)
+                if resp is None:
+                    # Sólo se reintentan individualmente los textos que han fallado dentro del lote
+                    resps[index] = self.extraer_informacion(textos[index])
+                elif resp.get("accepted", True) or len(self._model_cascade) < 2:
+                    resps[index] = resp
+                else:
+                    # El primer modelo de la cascada ya lo ha intentado en el lote: se sigue por el segundo
+                    resps[index] = self._extraer_informacion_en_cascada(textos[index], 1)
+        return resps
+
 
 class GeminiInfoExtractor(InfoExtractor):
     def __init__(self):
@@ -128,12 +496,14 @@ class GeminiInfoExtractor(InfoExtractor):
         self._fallback_model = None
 
 
-    def process_request_from_client(self):
+    def process_request_from_client(self, context: Optional[RequestContext] = None, response_format: Any = None):
+        if context is None:
+            context = self._new_request_context()
         respuesta = self.client.beta.chat.completions.parse(
-            model=self.model,
-            messages=self.messages,
-            response_format=self._json_schema,
-            **self._model_config
+            model=context.model,
+            messages=context.messages,
+            response_format=self._prompt_value("json_schema") if response_format is None else response_format,
+            **context.model_config
         )
         return respuesta
 
@@ -149,6 +519,13 @@ class InfoExtractorBuilder:
         self._json_template = {}
         self._examples = ""
         self._base_url = None
+        self._result_mode = RESULT_MODE_DICT
+        self._packing_token_budget = None
+        self._packing_max_items = 20
+        self._packing_output_tokens_per_item = None
+        self._model_cascade = None
+        self._acceptance_config = {}
+        self._key_aliasing = False
 
     def with_api_key(self, api_key: str) -> 'InfoExtractorBuilder':
         self._api_key = api_key
@@ -186,6 +563,28 @@ class InfoExtractorBuilder:
         self._examples = examples
         return self
 
+    def with_result_mode(self, result_mode: str) -> 'InfoExtractorBuilder':
+        self._result_mode = result_mode
+        return self
+
+    def with_packing(self, token_budget: Optional[int], max_items: int = 20,
+                     output_tokens_per_item: int = None) -> 'InfoExtractorBuilder':
+        self._packing_token_budget = token_budget
+        self._packing_max_items = max_items
+        self._packing_output_tokens_per_item = output_tokens_per_item
+        return self
+
+    def with_model_cascade(self, models: Optional[List[str]],
+                           acceptance_config: Dict[str, Any] = None) -> 'InfoExtractorBuilder':
+        # La cascada sustituye al modelo indicado con with_model y al modelo de respaldo (véase set_model_cascade)
+        self._model_cascade = models
+        self._acceptance_config = acceptance_config if acceptance_config is not None else {}
+        return self
+
+    def with_key_aliasing(self, enabled: bool = True) -> 'InfoExtractorBuilder':
+        self._key_aliasing = enabled
+        return self
+
     def build(self, option=None) -> InfoExtractor:
         if option is None and self._base_url is not None:
             option = "GeminiInfoExtractor"
@@ -207,7 +606,13 @@ class InfoExtractorBuilder:
             .set_field_definitions(self._field_definitions) \
             .set_messages_config(self._messages_config) \
             .set_json_template(self._json_template) \
-            .set_examples(self._examples)
+            .set_examples(self._examples) \
+            .set_result_mode(self._result_mode) \
+            .set_packing(self._packing_token_budget, self._packing_max_items, self._packing_output_tokens_per_item) \
+            .set_key_aliasing(self._key_aliasing)
+        if self._model_cascade:
+            extractor.set_model_cascade(self._model_cascade,
+                                        ExtractionAcceptanceChecker(self._json_schema, **self._acceptance_config))
         return extractor
 
 
@@ -0,0 +1,97 @@
+import base64
+import mmap
+import os
+import re
+from typing import Dict, Any, Union, Callable
+
+IMAGE_MIME_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".webp": "image/webp",
+                    ".gif": "image/gif", ".tif": "image/tiff", ".tiff": "image/tiff", ".bmp": "image/bmp"}
+DEFAULT_MIME_TYPE = "image/jpeg"
+
+# Una imagen puede ser:
+#   - la ruta de un fichero (str o PathLike),
+#   - un objeto bytes-like con el contenido del fichero,
+#   - un proveedor perezoso (callable sin argumentos que devuelve cualquiera de las otras formas),
+#   - un str ya codificado en base64 o un dict {"mime_type": ..., "image": base64}, como hasta ahora.
+ImageSource = Union[str, os.PathLike, bytes, bytearray, memoryview, Dict[str, Any], Callable[[], Any]]
+
+# Un base64 de una imagen real nunca es tan corto, y una ruta nunca es tan larga
+_MAX_PATH_LENGTH = 4096
+_BASE64_CHARS = re.compile(r"[A-Za-z0-9+/=\s]*")
+
+
+def _sniff_mime_type(data) -> str:
+    header = bytes(data[:12])
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"\x89PNG"):
+        return "image/png"
+    if header.startswith(b"GIF8"):
+        return "image/gif"
+    if header.startswith(b"RIFF") and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header.startswith(b"II*\x00") or header.startswith(b"MM\x00*"):
+        return "image/tiff"
+    if header.startswith(b"BM"):
+        return "image/bmp"
+    return DEFAULT_MIME_TYPE
+
+
+def _data_url(mime_type: str, encoded: str) -> str:
+    return "data:" + mime_type + ";base64," + encoded
+
+
+def _encode_bytes(data, mime_type: str = None) -> str:
+    if mime_type is None:
+        mime_type = _sniff_mime_type(data)
+    return _data_url(mime_type, base64.b64encode(data).decode("ascii"))
+
+
+def _encode_file(path: Union[str, os.PathLike], mime_type: str = None) -> str:
+    if mime_type is None:
+        mime_type = IMAGE_MIME_TYPES.get(os.path.splitext(os.fspath(path))[1].lower())
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return _encode_bytes(b"", mime_type)
+        # Se proyecta el fichero en memoria para no copiarlo antes de codificarlo
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return _encode_bytes(mapped, mime_type)
+
+
+def _is_path(image: str) -> bool:
+    return len(image) < _MAX_PATH_LENGTH and os.path.isfile(image)
+
+
+def _looks_like_path(image: str) -> bool:
+    # El base64 también puede contener "/" (el de un JPEG empieza por "/9j/"), así que el separador sólo indica una
+    # ruta si va acompañado de caracteres que no pertenecen al alfabeto base64
+    if len(image) >= _MAX_PATH_LENGTH:
+        return False
+    if os.path.splitext(image)[1].lower() in IMAGE_MIME_TYPES:
+        return True
+    return os.sep in image and _BASE64_CHARS.fullmatch(image) is None
+
+
+def image_to_data_url(image: ImageSource) -> str:
+    if callable(image):
+        return image_to_data_url(image())
+    if isinstance(image, dict):
+        return _data_url(image["mime_type"], image["image"])
+    if isinstance(image, os.PathLike):
+        return _encode_file(image)
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return _encode_bytes(image)
+    if _is_path(image):
+        return _encode_file(image)
+    if _looks_like_path(image):
+        raise FileNotFoundError(f"No se encuentra la imagen {image}")
+    return _data_url(DEFAULT_MIME_TYPE, image)
+
+
+def image_to_content_part(image: ImageSource) -> Dict[str, Any]:
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": image_to_data_url(image)
+        }
+    }
@@ -0,0 +1,338 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Iterable, Optional, Callable
+
+from .records import json_default
+
+STATE_PENDING = "pending"
+STATE_LEASED = "leased"
+STATE_DONE = "done"
+STATE_DEAD = "dead"
+
+
+class Job:
+    __slots__ = ("id", "payload", "attempts", "worker_id", "lease_token", "last_error", "lease_lost")
+
+    def __init__(self, id: str, payload: Dict[str, Any], attempts: int = 0, worker_id: str = None,
+                 lease_token: str = None, last_error: str = None):
+        self.id = id
+        self.payload = payload
+        self.attempts = attempts
+        self.worker_id = worker_id
+        self.lease_token = lease_token
+        self.last_error = last_error
+        # Se marca cuando el arrendamiento ha caducado y otro trabajador ha podido reclamar el elemento
+        self.lease_lost = False
+
+    def __repr__(self):
+        return f"Job(id={self.id!r}, attempts={self.attempts}, worker_id={self.worker_id!r})"
+
+
+class AbstractJobQueue(ABC):
+    # Errores pasajeros del almacenamiento (p. ej. una base de datos bloqueada por otro nodo) tras los que basta con
+    # esperar y reintentar
+    transient_errors = ()
+
+    def __init__(self, max_attempts: int = 3, lease_seconds: float = 300):
+        self._max_attempts = max_attempts
+        self._lease_seconds = lease_seconds
+
+    @property
+    def max_attempts(self):
+        return self._max_attempts
+
+    @property
+    def lease_seconds(self):
+        return self._lease_seconds
+
+    @abstractmethod
+    def add(self, items: Iterable[Dict[str, Any]]) -> int:
+        pass
+
+    @abstractmethod
+    def claim(self, worker_id: str) -> Optional[Job]:
+        pass
+
+    @abstractmethod
+    def heartbeat(self, job: Job) -> bool:
+        pass
+
+    @abstractmethod
+    def complete(self, job: Job, result: Any = None) -> bool:
+        pass
+
+    @abstractmethod
+    def fail(self, job: Job, error: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def dead_letters(self) -> List[Job]:
+        pass
+
+    @abstractmethod
+    def requeue_dead_letters(self) -> int:
+        pass
+
+    @abstractmethod
+    def results(self) -> Iterable[Any]:
+        pass
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        pass
+
+
+class SqliteJobQueue(AbstractJobQueue):
+    # No se usa el modo WAL: necesita memoria compartida entre procesos y no funciona cuando la base de datos está en
+    # un sistema de ficheros de red. Con el diario por defecto los bloqueos de fichero bastan para coordinar nodos.
+    # En ese caso es normal que, pasado busy_timeout, una operación falle con "database is locked".
+    transient_errors = (sqlite3.OperationalError,)
+
+    def __init__(self, path: str, max_attempts: int = 3, lease_seconds: float = 300, busy_timeout: float = 60):
+        super().__init__(max_attempts, lease_seconds)
+        self._path = path
+        self._busy_timeout = busy_timeout
+        self._local = threading.local()
+        with self._transaction() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, "
+                "payload TEXT NOT NULL, "
+                "state TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "worker_id TEXT, "
+                "lease_token TEXT, "
+                "lease_expires REAL, "
+                "last_error TEXT, "
+                "result TEXT, "
+                "updated REAL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires)")
+
+    @property
+    def path(self):
+        return self._path
+
+    def _transaction(self, read_only: bool = False) -> "_Transaction":
+        # sqlite3 no permite compartir una conexión entre hilos, así que se abre una por hilo
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=self._busy_timeout, isolation_level=None)
+            self._local.connection = connection
+        return _Transaction(connection, read_only)
+
+    def add(self, items: Iterable[Dict[str, Any]]) -> int:
+        now = time.time()
+        rows = [(str(item["id"]), json.dumps(item, ensure_ascii=False), STATE_PENDING, now) for item in items]
+        with self._transaction() as connection:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO jobs (id, payload, state, updated) VALUES (?, ?, ?, ?)", rows)
+            return connection.total_changes - before
+
+    def claim(self, worker_id: str) -> Optional[Job]:
+        now = time.time()
+        with self._transaction() as connection:
+            # Los elementos cuyo arrendamiento ha caducado y ya han agotado los intentos pasan a la lista de fallidos
+            connection.execute(
+                "UPDATE jobs SET state = ?, last_error = COALESCE(last_error, ?), lease_token = NULL, updated = ? "
+                "WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                (STATE_DEAD, "Arrendamiento caducado", now, STATE_LEASED, now, self._max_attempts))
+            row = connection.execute(
+                "SELECT id, payload, attempts, last_error FROM jobs "
+                "WHERE state = ? OR (state = ? AND lease_expires < ?) ORDER BY rowid LIMIT 1",
+                (STATE_PENDING, STATE_LEASED, now)).fetchone()
+            if row is None:
+                return None
+            job = Job(row[0], json.loads(row[1]), row[2] + 1, worker_id, uuid.uuid4().hex, row[3])
+            connection.execute(
+                "UPDATE jobs SET state = ?, attempts = ?, worker_id = ?, lease_token = ?, lease_expires = ?, "
+                "updated = ? WHERE id = ?",
+                (STATE_LEASED, job.attempts, worker_id, job.lease_token, now + self._lease_seconds, now, job.id))
+        return job
+
+    def heartbeat(self, job: Job) -> bool:
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET lease_expires = ?, updated = ? WHERE id = ? AND state = ? AND lease_token = ?",
+                (now + self._lease_seconds, now, job.id, STATE_LEASED, job.lease_token))
+            return cursor.rowcount == 1
+
+    def complete(self, job: Job, result: Any = None) -> bool:
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET state = ?, result = ?, lease_token = NULL, lease_expires = NULL, updated = ? "
+                "WHERE id = ? AND state = ? AND lease_token = ?",
+                (STATE_DONE, json.dumps(result, ensure_ascii=False, default=json_default), now, job.id, STATE_LEASED, job.lease_token))
+            return cursor.rowcount == 1
+
+    def fail(self, job: Job, error: str) -> Optional[str]:
+        now = time.time()
+        state = STATE_DEAD if job.attempts >= self._max_attempts else STATE_PENDING
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET state = ?, last_error = ?, lease_token = NULL, lease_expires = NULL, updated = ? "
+                "WHERE id = ? AND state = ? AND lease_token = ?",
+                (state, error, now, job.id, STATE_LEASED, job.lease_token))
+            if cursor.rowcount != 1:
+                return None
+        job.last_error = error
+        return state
+
+    def requeue_dead_letters(self) -> int:
+        now = time.time()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET state = ?, attempts = 0, updated = ? WHERE state = ?",
+                (STATE_PENDING, now, STATE_DEAD))
+            return cursor.rowcount
+
+    def dead_letters(self) -> List[Job]:
+        with self._transaction(read_only=True) as connection:
+            rows = connection.execute(
+                "SELECT id, payload, attempts, worker_id, last_error FROM jobs WHERE state = ? ORDER BY rowid",
+                (STATE_DEAD,)).fetchall()
+        return [Job(row[0], json.loads(row[1]), row[2], row[3], None, row[4]) for row in rows]
+
+    def results(self) -> Iterable[Any]:
+        with self._transaction(read_only=True) as connection:
+            rows = connection.execute(
+                "SELECT result FROM jobs WHERE state = ? ORDER BY rowid", (STATE_DONE,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        counters = {STATE_PENDING: 0, STATE_LEASED: 0, STATE_DONE: 0, STATE_DEAD: 0}
+        with self._transaction(read_only=True) as connection:
+            for state, count in connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"):
+                counters[state] = count
+        return counters
+
+
+class _Transaction:
+    def __init__(self, connection: sqlite3.Connection, read_only: bool = False):
+        self._connection = connection
+        self._read_only = read_only
+
+    def __enter__(self) -> sqlite3.Connection:
+        # BEGIN IMMEDIATE toma el bloqueo de escritura al empezar, de modo que dos trabajadores no pueden reclamar
+        # el mismo elemento. Las consultas de sólo lectura (stats, que sondean todos los trabajadores inactivos y el
+        # informe de progreso) usan una transacción diferida, que sólo toma el bloqueo compartido de lectura
+        self._connection.execute("BEGIN DEFERRED" if self._read_only else "BEGIN IMMEDIATE")
+        return self._connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self._connection.execute("COMMIT")
+        else:
+            self._connection.execute("ROLLBACK")
+        return False
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+class QueueWorker:
+    def __init__(self, queue: AbstractJobQueue, fn_process: Callable[[Dict[str, Any]], Any],
+                 fn_is_failure: Callable[[Any], Optional[str]] = None, worker_id: str = None,
+                 heartbeat_interval: float = None, idle_wait: float = 5.0, error_wait: float = 1.0):
+        self._queue = queue
+        self._fn_process = fn_process
+        self._fn_is_failure = fn_is_failure
+        self._worker_id = worker_id
+        self._heartbeat_interval = heartbeat_interval if heartbeat_interval is not None else queue.lease_seconds / 3
+        self._idle_wait = idle_wait
+        self._error_wait = error_wait
+        self._stop = threading.Event()
+
+    @property
+    def worker_id(self):
+        return self._worker_id if self._worker_id is not None else default_worker_id()
+
+    def stop(self):
+        self._stop.set()
+
+    def _heartbeat_loop(self, job: Job, finished: threading.Event):
+        wait = self._heartbeat_interval
+        while not finished.wait(wait):
+            try:
+                alive = self._queue.heartbeat(job)
+            except self._queue.transient_errors as e:
+                # Se reintenta pronto: si el latido no llega antes de que caduque el arrendamiento, otro nodo
+                # reclamaría el elemento y se procesaría dos veces
+                print(f"Error en el latido del elemento {job.id}, se reintenta: {e}")
+                wait = min(self._error_wait, self._heartbeat_interval)
+                continue
+            if not alive:
+                print(f"Se ha perdido el arrendamiento del elemento {job.id}")
+                job.lease_lost = True
+                return
+            wait = self._heartbeat_interval
+
+    def _call_queue(self, fn: Callable, *args) -> Any:
+        # Reintenta las operaciones de la cola mientras fallen por errores pasajeros y el trabajador no se detenga
+        while True:
+            try:
+                return fn(*args)
+            except self._queue.transient_errors as e:
+                print(f"Error de la cola en {fn.__name__}, se reintenta: {e}")
+                if self._stop.wait(self._error_wait):
+                    raise
+
+    def process_job(self, job: Job) -> Any:
+        finished = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat_loop, args=(job, finished), daemon=True)
+        heartbeat.start()
+        try:
+            result = self._fn_process(job.payload)
+            error = self._fn_is_failure(result) if self._fn_is_failure is not None else None
+        except Exception as e:
+            result = None
+            error = str(e)
+        finally:
+            finished.set()
+            heartbeat.join()
+        if job.lease_lost:
+            # Otro trabajador ya tiene el elemento; su resultado es el que cuenta
+            return result
+        if error is None:
+            job.lease_lost = not self._call_queue(self._queue.complete, job, result)
+        else:
+            state = self._call_queue(self._queue.fail, job, error)
+            job.lease_lost = state is None
+            if state == STATE_DEAD:
+                print(f"El elemento {job.id} pasa a la lista de fallidos tras {job.attempts} intentos: {error}")
+        return result
+
+    def run(self, stop_when_empty: bool = True, on_result: Callable[[Job, Any], None] = None) -> int:
+        processed = 0
+        worker_id = self.worker_id
+        while not self._stop.is_set():
+            try:
+                job = self._queue.claim(worker_id)
+                leased = self._queue.stats()[STATE_LEASED] if job is None and stop_when_empty else None
+            except self._queue.transient_errors as e:
+                print(f"Error al reclamar un elemento de la cola, se reintenta: {e}")
+                self._stop.wait(self._error_wait)
+                continue
+            if job is None:
+                if leased == 0:
+                    break
+                # Quedan elementos arrendados por otros trabajadores que pueden volver a la cola si caducan
+                self._stop.wait(self._idle_wait)
+                continue
+            result = self.process_job(job)
+            processed += 1
+            if job.lease_lost:
+                print(f"Se descarta el resultado del elemento {job.id}: el arrendamiento se perdió y lo procesa otro "
+                      f"trabajador")
+            elif on_result is not None:
+                on_result(job, result)
+        return processed
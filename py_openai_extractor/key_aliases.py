@@ -0,0 +1,167 @@
+import re
+from typing import Dict, Any, List, Iterable, Optional, Callable
+
+from .records import schema_root
+
+
+def _split_key(key: str) -> List[str]:
+    return [p for p in re.split(r"[_\W]+", key) if p]
+
+
+def _alias_candidates(key: str) -> Iterable[str]:
+    parts = [p.lower() for p in _split_key(key)] or [key.lower()]
+    initials = "".join(p[0] for p in parts)
+    yield initials
+    # Si las iniciales ya están ocupadas se alarga la última parte (cargo_commodity -> cc, cco, ccom, ...)
+    prefix = initials[:-1]
+    for length in range(2, len(parts[-1]) + 1):
+        yield prefix + parts[-1][:length]
+    index = 2
+    while True:
+        yield f"{initials}{index}"
+        index += 1
+
+
+class KeyAliaser:
+    # Sustituye las claves largas del json_schema y del json_template por alias cortos para que el modelo genere
+    # menos tokens de salida, y deshace la sustitución al decodificar la respuesta
+    def __init__(self, json_schema: Dict[str, Any], json_template: Any = None, reserved: Iterable[str] = ()):
+        keys = []
+        self._collect_schema_keys(schema_root(json_schema), keys)
+        self._collect_value_keys(json_template, keys)
+        used = set(keys) | set(reserved)
+        self._aliases = {}
+        for key in keys:
+            alias = self._make_alias(key, used)
+            if alias is not None:
+                self._aliases[key] = alias
+                used.add(alias)
+        self._expansions = {alias: key for key, alias in self._aliases.items()}
+        # En los textos (definiciones y ejemplos) se sustituyen las claves entre comillas sólo cuando van seguidas de
+        # ":" (posición de clave JSON), de modo que un valor como "cargo" se conserva, y las claves compuestas sin
+        # comillas, que no se confunden con palabras normales
+        names = sorted(self._aliases, key=len, reverse=True)
+        alternatives = ["([\"'])(" + "|".join(re.escape(n) for n in names) + ")\\1(?=\\s*:)"] if names else []
+        compound_names = [n for n in names if len(_split_key(n)) > 1]
+        if compound_names:
+            alternatives.append("(?<![\\w\"'])(" + "|".join(re.escape(n) for n in compound_names) + ")(?![\\w\"'])")
+        self._text_pattern = re.compile("|".join(alternatives)) if alternatives else None
+
+    @property
+    def aliases(self) -> Dict[str, str]:
+        return dict(self._aliases)
+
+    @staticmethod
+    def _make_alias(key: str, used: set) -> Optional[str]:
+        for candidate in _alias_candidates(key):
+            if len(candidate) >= len(key):
+                return None
+            if candidate not in used:
+                return candidate
+        return None
+
+    @staticmethod
+    def _add_key(key: str, keys: List[str]):
+        if key not in keys:
+            keys.append(key)
+
+    def _collect_schema_keys(self, schema: Any, keys: List[str]):
+        if isinstance(schema, list):
+            for item in schema:
+                self._collect_schema_keys(item, keys)
+        elif isinstance(schema, dict):
+            for name, value in schema.items():
+                if name == "properties" and isinstance(value, dict):
+                    for property_name, property_schema in value.items():
+                        self._add_key(property_name, keys)
+                        self._collect_schema_keys(property_schema, keys)
+                else:
+                    self._collect_schema_keys(value, keys)
+
+    def _collect_value_keys(self, value: Any, keys: List[str]):
+        if isinstance(value, list):
+            for item in value:
+                self._collect_value_keys(item, keys)
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                self._add_key(key, keys)
+                self._collect_value_keys(item, keys)
+
+    def alias(self, key: str) -> str:
+        return self._aliases.get(key, key)
+
+    def _alias_schema_node(self, schema: Any) -> Any:
+        if isinstance(schema, list):
+            return [self._alias_schema_node(item) for item in schema]
+        if not isinstance(schema, dict):
+            return schema
+        aliased = {}
+        for name, value in schema.items():
+            if name == "properties" and isinstance(value, dict):
+                aliased[name] = {self.alias(k): self._alias_schema_node(v) for k, v in value.items()}
+            elif name == "required" and isinstance(value, list):
+                aliased[name] = [self.alias(k) for k in value]
+            elif name in ("$defs", "definitions") and isinstance(value, dict):
+                aliased[name] = {k: self._alias_schema_node(v) for k, v in value.items()}
+            else:
+                aliased[name] = self._alias_schema_node(value)
+        return aliased
+
+    def alias_schema(self, json_schema: Dict[str, Any]) -> Dict[str, Any]:
+        if "json_schema" in json_schema:
+            aliased = dict(json_schema)
+            aliased["json_schema"] = self.alias_schema(json_schema["json_schema"])
+            return aliased
+        if "schema" in json_schema:
+            aliased = dict(json_schema)
+            aliased["schema"] = self._alias_schema_node(json_schema["schema"])
+            return aliased
+        return self._alias_schema_node(json_schema)
+
+    def alias_value(self, value: Any) -> Any:
+        if isinstance(value, list):
+            return [self.alias_value(item) for item in value]
+        if isinstance(value, dict):
+            return {self.alias(k): self.alias_value(v) for k, v in value.items()}
+        return value
+
+    def alias_text(self, text: str) -> str:
+        if self._text_pattern is None or not isinstance(text, str):
+            return text
+        return self._text_pattern.sub(self._alias_match, text)
+
+    def _alias_match(self, match) -> str:
+        if match.group(2) is not None:
+            return match.group(1) + self._aliases[match.group(2)] + match.group(1)
+        return self._aliases[match.group(3)]
+
+    def alias_field_definitions(self, field_definitions: Dict[str, str]) -> Dict[str, str]:
+        # Se conserva el nombre completo en la definición para que el modelo sepa qué significa cada alias
+        aliased = {}
+        for key, definition in field_definitions.items():
+            if key in self._aliases:
+                aliased[self._aliases[key]] = f"({key}) {self.alias_text(definition)}"
+            else:
+                aliased[key] = self.alias_text(definition)
+        return aliased
+
+    def expand_object(self, obj: Dict[str, Any], on_expand: Callable[[int], None] = None) -> Dict[str, Any]:
+        expanded = {}
+        saved = 0
+        for key, value in obj.items():
+            full_key = self._expansions.get(key)
+            if full_key is None:
+                expanded[key] = value
+            else:
+                expanded[full_key] = value
+                saved += len(full_key) - len(key)
+        if on_expand is not None and saved:
+            on_expand(saved)
+        return expanded
+
+    def expand(self, value: Any, on_expand: Callable[[int], None] = None) -> Any:
+        if isinstance(value, list):
+            return [self.expand(item, on_expand) for item in value]
+        if isinstance(value, dict):
+            return self.expand_object({k: self.expand(v, on_expand) for k, v in value.items()}, on_expand)
+        return value
@@ -1,5 +1,6 @@
-from .abstract_openai_agent import AbstractOpenAiChatAgent, BaseOpenAiTextChatAgent
-from typing import Dict, Any, List
+from .abstract_openai_agent import AbstractOpenAiChatAgent, BaseOpenAiTextChatAgent, RequestContext
+from .image_sources import ImageSource, image_to_content_part
+from typing import Dict, Any, List, Optional
 from pydoc import locate
 import re
 
@@ -70,30 +71,20 @@ class QwenOcrProcessor(AbstractOpenAiChatAgent):
             self._user_message = user_message
         return self
 
-    def set_images(self, base64_images:List) -> 'QwenOcrProcessor':
+    def set_images(self, base64_images:List[ImageSource]) -> 'QwenOcrProcessor':
         self._base64_images = base64_images
         return self
 
-    def _create_messages(self) -> List[Dict[str, str]]:
+    def _create_messages(self, images: List[ImageSource] = None) -> List[Dict[str, str]]:
+        if images is None:
+            images = self._base64_images
         full_user_message = [
             {"type": "text", "text": self._user_message}
         ]
 
-        for base64_image in self._base64_images:
-            if isinstance(base64_image, dict):
-                full_user_message.append({
-                    "type": "image_url",
-                    "image_url":{
-                        "url": "data:"+base64_image["mime_type"]+";base64,"+base64_image["image"]
-                    }
-                })
-            else:
-                full_user_message.append({
-                    "type": "image_url",
-                    "image_url":{
-                        "url": "data:image/jpeg;base64,"+base64_image
-                    }
-                })
+        # Las imágenes se leen y codifican aquí, sólo mientras se construye la petición
+        for image in images:
+            full_user_message.append(image_to_content_part(image))
 
 
         return [
@@ -101,22 +92,28 @@ class QwenOcrProcessor(AbstractOpenAiChatAgent):
             {"role": "user", "content": full_user_message}
         ]
 
-    def process_request_from_client(self):
-        if "temperature" not in self._model_config:
-            self._model_config["temperature"]=0
-        if "max_tokens" not in self._model_config or self._model_config["max_tokens"]>8192:
-            self._model_config["max_tokens"]=8192
+    def process_request_from_client(self, context: Optional[RequestContext] = None):
+        if context is None:
+            context = self._new_request_context()
+        # Los valores por defecto se aplican a la copia de la configuración de esta petición, no al agente
+        model_config = context.model_config
+        if "temperature" not in model_config:
+            model_config["temperature"]=0
+        if "max_tokens" not in model_config or model_config["max_tokens"]>8192:
+            model_config["max_tokens"]=8192
         response = self.client.chat.completions.create(
-            model=self.model,
-            messages=self.messages,
-            **self._model_config
+            model=context.model,
+            messages=context.messages,
+            **model_config
         )
         return response
 
-    def getTextFromImage(self, images):
-        self._base64_images = images
-        self.messages = self._create_messages()
-        response = self.process_request_from_client()
+    def getTextFromImage(self, images: List[ImageSource] = None):
+        # Los mensajes (con los data URL de las imágenes) sólo viven en el contexto de esta petición y se sueltan en
+        # cuanto vuelve, de modo que un lote de páginas no se queda en memoria
+        context = self._new_request_context(messages=self._create_messages(images=images))
+        response = self.process_request_from_client(context)
+        del context
         text = response.choices[0].message.content
         return remove_markdown(text)
 
@@ -170,40 +167,31 @@ class GptOcrCorrector(AbstractOpenAiChatAgent):
             self._user_message = user_message
         return self
 
-    def set_text_and_images(self, texts:str, base64_images:List) -> 'QwenOcrCorrector':
+    def set_text_and_images(self, texts:str, base64_images:List[ImageSource]) -> 'QwenOcrCorrector':
         self._text = texts
         self._base64_images = base64_images
         return self
 
-    def _create_messages(self) -> List[Dict[str, str]]:
+    def _create_messages(self, text: str = None, images: List[ImageSource] = None) -> List[Dict[str, str]]:
+        if text is None:
+            text = self._text
+        if images is None:
+            images = self._base64_images
         if "{full_text}" in self._user_message:
             user_message = self._user_message.format(
-                full_text=self._text
+                full_text=text
             )
         elif self._user_message.endswith("\n"):
-            user_message = self._user_message + "" + self._text
+            user_message = self._user_message + "" + text
         else:
-            user_message = self._user_message + "\n\n" + self._text
+            user_message = self._user_message + "\n\n" + text
 
         full_user_message = [
             {"type": "text", "text": user_message}
         ]
 
-        for base64_image in self._base64_images:
-            if isinstance(base64_image, dict):
-                full_user_message.append({
-                    "type": "image_url",
-                    "image_url":{
-                        "url": "data:"+base64_image["mime_type"]+";base64,"+base64_image["image"]
-                    }
-                })
-            else:
-                full_user_message.append({
-                    "type": "image_url",
-                    "image_url":{
-                        "url": "data:image/jpeg;base64,"+base64_image
-                    }
-                })
+        for image in images:
+            full_user_message.append(image_to_content_part(image))
 
 
         return [
@@ -211,23 +199,26 @@ class GptOcrCorrector(AbstractOpenAiChatAgent):
             {"role": "user", "content": full_user_message}
         ]
 
-    def getFixedOcrText(self, text, images):
-        self._text=text
-        self._base64_images = images
-        self.messages = self._create_messages()
-        response = self.process_request_from_client()
+    def getFixedOcrText(self, text, images: List[ImageSource]):
+        context = self._new_request_context(messages=self._create_messages(text, images))
+        response = self.process_request_from_client(context)
+        del context
         newText = response.choices[0].message.content
         return remove_markdown(newText)
 
-    def process_request_from_client(self):
-        if "temperature" not in self._model_config:
-            self._model_config["temperature"]=0
-        if "max_tokens" not in self._model_config or self._model_config["max_tokens"]>16384:
-            self._model_config["max_tokens"]=8192
+    def process_request_from_client(self, context: Optional[RequestContext] = None):
+        if context is None:
+            context = self._new_request_context()
+        # Los valores por defecto se aplican a la copia de la configuración de esta petición, no al agente
+        model_config = context.model_config
+        if "temperature" not in model_config:
+            model_config["temperature"]=0
+        if "max_tokens" not in model_config or model_config["max_tokens"]>16384:
+            model_config["max_tokens"]=8192
         response = self.client.chat.completions.create(
-            model=self.model,
-            messages=self.messages,
-            **self._model_config
+            model=context.model,
+            messages=context.messages,
+            **model_config
         )
         return response
 
@@ -275,40 +266,31 @@ class QwenOcrCorrector(QwenOcrProcessor):
     def text(self, text):
         self._text = text
 
-    def set_text_and_images(self, texts:str, base64_images:List) -> 'QwenOcrCorrector':
+    def set_text_and_images(self, texts:str, base64_images:List[ImageSource]) -> 'QwenOcrCorrector':
         self._text = texts
         self._base64_images = base64_images
         return self
 
-    def _create_messages(self) -> List[Dict[str, str]]:
+    def _create_messages(self, text: str = None, images: List[ImageSource] = None) -> List[Dict[str, str]]:
+        if text is None:
+            text = self._text
+        if images is None:
+            images = self._base64_images
         if "{full_text}" in self._user_message:
             user_message = self._user_message.format(
-                full_text=self._text
+                full_text=text
             )
         elif self._user_message.endswith("\n"):
-            user_message = self._user_message + "" + self._text
+            user_message = self._user_message + "" + text
         else:
-            user_message = self._user_message + "\n\n" + self._text
+            user_message = self._user_message + "\n\n" + text
 
         full_user_message = [
             {"type": "text", "text": user_message}
         ]
 
-        for base64_image in self._base64_images:
-            if isinstance(base64_image, dict):
-                full_user_message.append({
-                    "type": "image_url",
-                    "image_url":{
-                        "url": "data:"+base64_image["mime_type"]+";base64,"+base64_image["image"]
-                    }
-                })
-            else:
-                full_user_message.append({
-                    "type": "image_url",
-                    "image_url":{
-                        "url": "data:image/jpeg;base64,"+base64_image
-                    }
-                })
+        for image in images:
+            full_user_message.append(image_to_content_part(image))
 
 
         return [
@@ -316,11 +298,10 @@ class QwenOcrCorrector(QwenOcrProcessor):
             {"role": "user", "content": full_user_message}
         ]
 
-    def getFixedOcrText(self, text, images):
-        self._text=text
-        self._base64_images = images
-        self.messages = self._create_messages()
-        response = self.process_request_from_client()
+    def getFixedOcrText(self, text, images: List[ImageSource]):
+        context = self._new_request_context(messages=self._create_messages(text, images))
+        response = self.process_request_from_client(context)
+        del context
         newText = response.choices[0].message.content
         return remove_markdown(newText)
 
@@ -1,5 +1,6 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
 from.extractor import InfoExtractorBuilder
+from .records import RESULT_MODE_DICT
 
 
 class AutonewsExtractorAdaptor:
@@ -8,6 +9,11 @@ class AutonewsExtractorAdaptor:
         self._api_key = api_key
         api = config_json['api'] if "api" in config_json else None
         base_url = config_json['base_url'] if "base_url" in config_json else None
+        result_mode = config_json['result_mode'] if "result_mode" in config_json else RESULT_MODE_DICT
+        packing = config_json['packing'] if "packing" in config_json else {}
+        # Si se define model_cascade, sus modelos sustituyen a config_json['model']; éste sigue siendo obligatorio
+        model_cascade = config_json['model_cascade'] if "model_cascade" in config_json else {}
+        key_aliasing = config_json['key_aliasing'] if "key_aliasing" in config_json else False
         self._extractor = InfoExtractorBuilder().with_api_key(api_key)\
             .with_model(config_json['model'])\
             .with_base_url(base_url)\
@@ -17,6 +23,11 @@ class AutonewsExtractorAdaptor:
             .with_model_config(config_json['model_config'])\
             .with_examples(config_json['ai_instructions']['examples'])\
             .with_messages_config(config_json['ai_instructions']['messages_config'])\
+            .with_result_mode(result_mode)\
+            .with_packing(packing.get('token_budget'), packing.get('max_items', 20),
+                          packing.get('output_tokens_per_item'))\
+            .with_model_cascade(model_cascade.get('models'), model_cascade.get('acceptance'))\
+            .with_key_aliasing(key_aliasing)\
             .build(api)
 
     @property
@@ -27,9 +38,24 @@ class AutonewsExtractorAdaptor:
     def api_key(self):
         return self._api_key
 
+    @property
+    def packing_max_items(self):
+        return self._extractor.packing_max_items if self._extractor.packing_enabled else 1
+
+    @property
+    def cascade_stats(self):
+        return self._extractor.cascade_stats if self._extractor.model_cascade else None
+
+    @property
+    def key_aliasing_stats(self):
+        return self._extractor.key_aliasing_stats if self._extractor.key_aliasing_enabled else None
+
     def extract_data(self, text):
         return self._extractor.extraer_informacion(text)
 
+    def extract_data_list(self, texts: List[str]):
+        return self._extractor.extraer_informacion_lote(texts)
+
 
 class AutonewsExtractorAdaptorBuilder:
     def __init__(self):
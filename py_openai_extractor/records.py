@@ -0,0 +1,184 @@
+import json
+import keyword
+import re
+from typing import Dict, Any, List, Optional, FrozenSet, Type, Tuple
+
+RESULT_MODE_DICT = "dict"
+RESULT_MODE_RECORDS = "records"
+
+
+class Record:
+    # Clase base de los registros generados a partir del json_schema. Cada subclase declara sus campos en __slots__,
+    # de modo que una instancia ocupa bastante menos memoria que el dict equivalente. Se mantiene el acceso por clave
+    # (record["cargo_list"]) y los métodos de lectura de un dict (get, keys, values, items) para que el código que
+    # trabaja con los dicts de json.loads siga funcionando.
+    __slots__ = ()
+    _fields = ()
+
+    def __init__(self, **kwargs):
+        for field in self._fields:
+            setattr(self, field, kwargs.get(field))
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def get(self, key, default=None):
+        if key not in self._fields:
+            return default
+        return getattr(self, key)
+
+    def keys(self):
+        return self._fields
+
+    def values(self):
+        return [getattr(self, field) for field in self._fields]
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self._fields]
+
+    def _asdict(self) -> Dict[str, Any]:
+        return {field: to_builtin(getattr(self, field)) for field in self._fields}
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return self._fields == other._fields and all(getattr(self, f) == getattr(other, f) for f in self._fields)
+        if isinstance(other, dict):
+            return self._asdict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        values = ", ".join(f"{field}={getattr(self, field)!r}" for field in self._fields)
+        return f"{type(self).__name__}({values})"
+
+
+def to_builtin(value: Any) -> Any:
+    if isinstance(value, Record):
+        return value._asdict()
+    if isinstance(value, list):
+        return [to_builtin(v) for v in value]
+    if isinstance(value, dict):
+        return {k: to_builtin(v) for k, v in value.items()}
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return value
+
+
+def json_default(value: Any) -> Any:
+    # Para usar como json.dumps(..., default=json_default) con resultados que contienen registros
+    if isinstance(value, Record) or hasattr(value, "model_dump"):
+        return to_builtin(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def schema_root(json_schema: Dict[str, Any]) -> Dict[str, Any]:
+    # Acepta tanto el response_format completo ({"type": "json_schema", "json_schema": {"schema": ...}}) como el
+    # bloque json_schema o el propio esquema
+    if "json_schema" in json_schema:
+        json_schema = json_schema["json_schema"]
+    if "schema" in json_schema:
+        json_schema = json_schema["schema"]
+    return json_schema
+
+
+def _class_name(name: str) -> str:
+    parts = [p for p in re.split(r"[^0-9a-zA-Z]+", name) if p]
+    class_name = "".join(p[:1].upper() + p[1:] for p in parts) or "Record"
+    if class_name[0].isdigit():
+        class_name = "R" + class_name
+    return class_name
+
+
+# Nombres de los métodos de lectura de Record; un objeto con un campo así se queda como dict
+_RESERVED_FIELDS = frozenset(("get", "keys", "values", "items"))
+
+
+def _is_valid_field(name: str) -> bool:
+    return name.isidentifier() and not keyword.iskeyword(name) and not name.startswith("_") \
+        and name not in _RESERVED_FIELDS
+
+
+class RecordFactory:
+    def __init__(self, json_schema: Dict[str, Any]):
+        self._root = schema_root(json_schema)
+        self._definitions = dict(self._root.get("$defs", {}))
+        self._definitions.update(self._root.get("definitions", {}))
+        self._classes_by_keys: Dict[FrozenSet[str], Type[Record]] = {}
+        self._class_names = set()
+        root_name = json_schema.get("json_schema", {}).get("name") or self._root.get("title", "Result")
+        self._visit(self._root, root_name, set())
+
+    @property
+    def record_classes(self) -> List[Type[Record]]:
+        return list(self._classes_by_keys.values())
+
+    def _resolve(self, schema: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+        ref = schema.get("$ref")
+        if ref is None:
+            return schema, None
+        name = ref.rsplit("/", 1)[-1]
+        return self._definitions.get(name, {}), name
+
+    def _visit(self, schema: Any, name: str, visited_refs: set):
+        if not isinstance(schema, dict):
+            return
+        schema, ref_name = self._resolve(schema)
+        if ref_name is not None:
+            if ref_name in visited_refs:
+                return
+            visited_refs = visited_refs | {ref_name}
+            name = ref_name
+        for option in schema.get("anyOf", []) + schema.get("oneOf", []):
+            self._visit(option, name, visited_refs)
+        if "items" in schema:
+            self._visit(schema["items"], name, visited_refs)
+        properties = schema.get("properties")
+        if not properties:
+            return
+        for property_name, property_schema in properties.items():
+            self._visit(property_schema, property_name, visited_refs)
+        fields = tuple(properties.keys())
+        keys = frozenset(fields)
+        if keys in self._classes_by_keys or not all(_is_valid_field(f) for f in fields):
+            # Los objetos con claves que no pueden ser atributos se quedan como dict
+            return
+        self._classes_by_keys[keys] = self._create_class(schema.get("title", name), fields)
+
+    def _create_class(self, name: str, fields: tuple) -> Type[Record]:
+        class_name = _class_name(name)
+        base_name = class_name
+        index = 2
+        while class_name in self._class_names:
+            class_name = f"{base_name}{index}"
+            index += 1
+        self._class_names.add(class_name)
+        return type(class_name, (Record,), {"__slots__": fields, "_fields": fields})
+
+    def object_hook(self, obj: Dict[str, Any]) -> Any:
+        record_class = self._classes_by_keys.get(frozenset(obj))
+        if record_class is None:
+            return obj
+        return record_class(**obj)
+
+    def decode(self, raw: str) -> Any:
+        # Una sola pasada: el decodificador de json construye directamente los registros
+        return json.loads(raw, object_hook=self.object_hook)
+
+    def from_obj(self, obj: Any) -> Any:
+        if isinstance(obj, Record):
+            return obj
+        if isinstance(obj, list):
+            return [self.from_obj(v) for v in obj]
+        if isinstance(obj, dict):
+            return self.object_hook({k: self.from_obj(v) for k, v in obj.items()})
+        return obj
@@ -13,5 +13,10 @@ setup(name='py_openai_extractor',
 	    'openai',
         'babel',
     ],
+    entry_points={
+        'console_scripts': [
+            'portada-openai-extractor=py_openai_extractor.cli:main',
+        ],
+    },
     python_requires='>=3.9',
     zip_safe=False)
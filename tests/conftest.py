@@ -0,0 +1,20 @@
+import sys
+import types
+
+# El paquete importa openai y babel al cargarse; si no están instalados se sustituyen por módulos mínimos, ya que
+# las pruebas nunca llegan a usarlos
+try:
+    import openai  # noqa: F401
+except ImportError:
+    _openai = types.ModuleType("openai")
+    _openai.OpenAI = lambda **kwargs: None
+    sys.modules["openai"] = _openai
+try:
+    import babel.dates  # noqa: F401
+except ImportError:
+    _babel = types.ModuleType("babel")
+    _babel_dates = types.ModuleType("babel.dates")
+    _babel_dates.format_date = lambda date, format=None, locale=None: str(date)
+    _babel.dates = _babel_dates
+    sys.modules["babel"] = _babel
+    sys.modules["babel.dates"] = _babel_dates
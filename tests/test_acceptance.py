@@ -0,0 +1,38 @@
+from py_openai_extractor.acceptance import ExtractionAcceptanceChecker
+
+
+def test_quantity_and_date_keys_match_on_last_word():
+    checker = ExtractionAcceptanceChecker()
+    content = {
+        "candidate_name": "Juan",
+        "updated_by": "redacción",
+        "validated": "sí",
+        "cargo_quantity_unit": "cajas",
+        "date_text": "ayer",
+        "cargo_list": [{"cargo_quantity": 12, "cargo_unit": "cajas"}],
+        "arrival_date": "1852-03-04",
+        "departureDate": "04/03/1852",
+    }
+    result = checker.check(content)
+    assert result.accepted, result.reasons
+
+
+def test_quantity_and_date_values_are_checked():
+    checker = ExtractionAcceptanceChecker(year_range=(1800, 1900))
+    result = checker.check({"cargo_quantity": "doce", "arrival_date": "1999-01-01", "departureDate": "mañana"})
+    assert not result.accepted
+    assert result.reasons == ["$.cargo_quantity: la cantidad no es numérica", "$.arrival_date: año fuera de rango",
+                              "$.departureDate: fecha no reconocida"]
+
+
+def test_explicit_keys_override_the_default_rule():
+    checker = ExtractionAcceptanceChecker(quantity_keys=["peso"], date_keys=["dia"])
+    assert not checker.check({"peso": -3}).accepted
+    assert not checker.check({"dia": "ayer"}).accepted
+    assert checker.check({"cargo_quantity": "doce", "arrival_date": "ayer"}).accepted
+
+
+def test_field_coverage_is_opt_in():
+    content = {"ship_name": "Rosa", "captain": None, "cargo_list": []}
+    assert ExtractionAcceptanceChecker().check(content).accepted
+    assert not ExtractionAcceptanceChecker(min_field_coverage=0.5).check(content).accepted
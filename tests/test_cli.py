@@ -0,0 +1,60 @@
+import json
+import threading
+import time
+
+import pytest
+
+from py_openai_extractor.cli import load_checkpoint, run
+
+
+class _Processor:
+    batch_size = 1
+
+    def __init__(self):
+        self.processed = []
+        self._lock = threading.Lock()
+
+    def process_batch(self, items):
+        time.sleep(0.05)
+        with self._lock:
+            self.processed.extend(item["id"] for item in items)
+        return [{"id": item["id"], "extraction": {"status": 0}} for item in items]
+
+
+class _InterruptedWriter:
+    # Simula un Ctrl-C mientras se escribe el primer resultado
+    def __init__(self):
+        self.records = []
+        self._interrupted = False
+
+    def write(self, record):
+        if not self._interrupted:
+            self._interrupted = True
+            raise KeyboardInterrupt
+        self.records.append(record)
+
+
+# Con 3 elementos la interrupción llega durante la espera final; con 20, mientras aún se envían lotes
+@pytest.mark.parametrize("count", [3, 20])
+def test_interrupted_run_writes_in_flight_results(count):
+    processor = _Processor()
+    writer = _InterruptedWriter()
+    items = [{"id": str(i)} for i in range(count)]
+    with pytest.raises(KeyboardInterrupt):
+        run(items, processor, writer, workers=2, progress_interval=60)
+    # Todo lo que se ha llegado a procesar (y facturar) queda escrito, incluido el resultado interrumpido
+    assert processor.processed
+    assert sorted(processor.processed) == sorted(record["id"] for record in writer.records)
+
+
+def test_checkpoint_last_record_per_id_wins(tmp_path):
+    output = tmp_path / "out.jsonl"
+    lines = [
+        {"id": "a", "extraction": {"status": -1}},
+        {"id": "b", "extraction": {"status": 0}},
+        {"id": "a", "extraction": {"status": 0}},
+        {"id": "c", "error": "timeout"},
+    ]
+    output.write_text("\n".join(json.dumps(line) for line in lines) + "\n{\"id\": \"d\"", encoding="utf-8")
+    assert load_checkpoint(str(output)) == {"a", "b", "c"}
+    assert load_checkpoint(str(output), retry_failed=True) == {"a", "b"}
@@ -0,0 +1,137 @@
+import asyncio
+import base64
+import copy
+import json
+import random
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from py_openai_extractor import abstract_openai_agent
+from py_openai_extractor.extractor import InfoExtractor
+from py_openai_extractor.ocr_corrector import QwenOcrProcessor, QwenOcrCorrector
+
+THREADS = 32
+EXTRACTIONS = 2000
+OCR_CALLS = 500
+ASYNC_CALLS = 300
+
+JSON_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "echo",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"texto": {"type": "string"}, "model": {"type": "string"}},
+            "required": ["texto", "model"],
+            "additionalProperties": False
+        }
+    }
+}
+
+MESSAGES_CONFIG = {
+    "system": {"role": "system", "content": "Extrae la información."},
+    "template": {"content": "{json_template}\n{field_definitions}\n{input_example}\n<<{input_text}>>"}
+}
+
+
+def _response(content):
+    message = types.SimpleNamespace(content=content, parsed=None)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+
+class _EchoCompletions:
+    # Responde con el texto de entrada de la propia petición; una pausa aleatoria obliga a que las peticiones de
+    # distintos hilos se intercalen
+    def create(self, model, messages, **kwargs):
+        time.sleep(random.random() / 1000)
+        content = messages[-1]["content"]
+        if isinstance(content, str):
+            texto = content[content.index("<<") + 2:content.rindex(">>")]
+            return _response(json.dumps({"texto": texto, "model": model}, ensure_ascii=False))
+        pages = []
+        for part in content:
+            if part["type"] == "image_url":
+                pages.append(base64.b64decode(part["image_url"]["url"].split(",", 1)[1]).decode("ascii"))
+        return _response(" ".join(pages))
+
+
+class _EchoClient:
+    def __init__(self, **kwargs):
+        self.chat = types.SimpleNamespace(completions=_EchoCompletions())
+
+
+@pytest.fixture
+def agents(monkeypatch):
+    monkeypatch.setattr(abstract_openai_agent, "OpenAI", _EchoClient)
+    extractor = InfoExtractor()
+    extractor.set_api_key("test").set_model("gpt-4o-mini").set_model_config({"temperature": 0})
+    extractor.set_json_schema(JSON_SCHEMA).set_messages_config(MESSAGES_CONFIG)
+    extractor.set_field_definitions({"texto": "El texto de entrada", "model": "El modelo"})
+    extractor.set_json_template({"texto": "", "model": ""})
+    ocr_processor = QwenOcrProcessor().set_api_key("test")
+    return extractor, ocr_processor
+
+
+def _snapshot(agent):
+    return agent.model, copy.deepcopy(agent.messages), copy.deepcopy(agent.model_config)
+
+
+def _extract(extractor, index):
+    texto = f"Noticia {index}: entrada del vapor número {index}"
+    return texto, extractor.extraer_informacion(texto)
+
+
+def _ocr(ocr_processor, index):
+    pages = [f"pagina-{index}-{page}" for page in range(1 + index % 3)]
+    return " ".join(pages), ocr_processor.getTextFromImage([p.encode("ascii") for p in pages])
+
+
+def test_shared_agents_across_threads(agents):
+    extractor, ocr_processor = agents
+    extractor_before = _snapshot(extractor)
+    ocr_before = _snapshot(ocr_processor)
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        extractions = [executor.submit(_extract, extractor, i) for i in range(EXTRACTIONS)]
+        ocr_calls = [executor.submit(_ocr, ocr_processor, i) for i in range(OCR_CALLS)]
+        for future in extractions:
+            texto, resp = future.result()
+            assert resp["status"] == 0
+            assert resp["content"] == {"texto": texto, "model": "gpt-4o-mini"}
+        for future in ocr_calls:
+            expected, text = future.result()
+            assert text == expected
+    assert _snapshot(extractor) == extractor_before
+    assert _snapshot(ocr_processor) == ocr_before
+
+
+def test_shared_agents_from_asyncio(agents):
+    extractor, ocr_processor = agents
+    extractor_before = _snapshot(extractor)
+    ocr_before = _snapshot(ocr_processor)
+
+    async def run_all():
+        calls = []
+        for i in range(ASYNC_CALLS):
+            calls.append(asyncio.to_thread(_extract, extractor, i))
+            calls.append(asyncio.to_thread(_ocr, ocr_processor, i))
+        return await asyncio.gather(*calls)
+
+    results = asyncio.run(run_all())
+    for index, (expected, result) in enumerate(results):
+        if index % 2 == 0:
+            assert result["content"] == {"texto": expected, "model": "gpt-4o-mini"}
+        else:
+            assert result == expected
+    assert _snapshot(extractor) == extractor_before
+    assert _snapshot(ocr_processor) == ocr_before
+
+
+def test_ocr_corrector_images_keyword(agents):
+    # QwenOcrCorrector redefine _create_messages(text, images); getTextFromImage debe pasar las imágenes por nombre
+    corrector = QwenOcrCorrector().set_api_key("test")
+    text = corrector.getTextFromImage([b"pagina-1"])
+    assert "pagina-1" in text
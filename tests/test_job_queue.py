@@ -0,0 +1,162 @@
+import sqlite3
+import time
+import types
+
+import pytest
+
+from py_openai_extractor.cli import JsonlResultWriter, run_from_queue
+from py_openai_extractor.job_queue import SqliteJobQueue, QueueWorker, STATE_DONE
+
+
+class _LockedOnceQueue(SqliteJobQueue):
+    # Cada operación falla una vez con "database is locked", como ocurre en un sistema de ficheros compartido
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.locked = {"claim", "heartbeat", "complete"}
+
+    def _maybe_locked(self, name):
+        if name in self.locked:
+            self.locked.discard(name)
+            raise sqlite3.OperationalError("database is locked")
+
+    def claim(self, worker_id):
+        self._maybe_locked("claim")
+        return super().claim(worker_id)
+
+    def heartbeat(self, job):
+        self._maybe_locked("heartbeat")
+        return super().heartbeat(job)
+
+    def complete(self, job, result=None):
+        self._maybe_locked("complete")
+        return super().complete(job, result)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "queue.db")
+
+
+def test_worker_retries_locked_database(db_path):
+    queue = _LockedOnceQueue(db_path, lease_seconds=0.5)
+    queue.add([{"id": "a"}, {"id": "b"}])
+
+    def slow(payload):
+        time.sleep(0.3)
+        return payload["id"]
+
+    results = []
+    worker = QueueWorker(queue, slow, heartbeat_interval=0.1, idle_wait=0.01, error_wait=0.01)
+    assert worker.run(on_result=lambda job, result: results.append(result)) == 2
+    assert sorted(results) == ["a", "b"]
+    assert queue.locked == set()
+    assert queue.stats()[STATE_DONE] == 2
+
+
+class _BrokenQueue(SqliteJobQueue):
+    def claim(self, worker_id):
+        raise RuntimeError("cola inaccesible")
+
+
+def test_run_from_queue_reports_dead_workers(db_path, tmp_path):
+    queue = _BrokenQueue(db_path)
+    queue.add([{"id": "a"}])
+    processor = types.SimpleNamespace(process=lambda payload: payload)
+    writer = JsonlResultWriter(str(tmp_path / "out.jsonl"))
+    try:
+        counters = run_from_queue(queue, processor, writer, workers=2, progress_interval=60)
+    finally:
+        writer.close()
+    assert counters["worker_errors"] == 2
+    assert counters["processed"] == 0
+
+
+def test_expired_lease_is_reclaimed(db_path):
+    queue = SqliteJobQueue(db_path, lease_seconds=0.2)
+    queue.add([{"id": "a"}])
+    first = queue.claim("w1")
+    assert first.attempts == 1
+    assert queue.claim("w2") is None
+    time.sleep(0.3)
+    second = queue.claim("w2")
+    assert second.id == "a" and second.attempts == 2
+    # El primer trabajador ya no puede confirmar ni mantener el elemento
+    assert not queue.heartbeat(first)
+    assert not queue.complete(first, "w1")
+    assert queue.fail(first, "error") is None
+    assert queue.complete(second, "w2")
+    assert queue.results() == ["w2"]
+
+
+def test_lost_lease_result_is_discarded(db_path):
+    queue = SqliteJobQueue(db_path, lease_seconds=0.3)
+    queue.add([{"id": "a"}])
+    slow_job = queue.claim("slow")
+    time.sleep(0.4)
+
+    results = []
+    fast = QueueWorker(queue, lambda payload: "fast", idle_wait=0.01)
+    assert fast.run(on_result=lambda job, result: results.append(result)) == 1
+
+    slow = QueueWorker(queue, lambda payload: "slow", heartbeat_interval=60)
+    assert slow.process_job(slow_job) == "slow"
+    assert slow_job.lease_lost
+    assert results == ["fast"]
+    assert queue.results() == ["fast"]
+
+
+def test_failed_job_is_dead_lettered_at_max_attempts(db_path):
+    queue = SqliteJobQueue(db_path, max_attempts=2)
+    queue.add([{"id": "a"}, {"id": "b"}])
+
+    def process(payload):
+        if payload["id"] == "a":
+            raise ValueError("texto ilegible")
+        return payload["id"]
+
+    calls = []
+    worker = QueueWorker(queue, process, idle_wait=0.01)
+    worker.run(on_result=lambda job, result: calls.append((job.id, job.attempts)))
+    assert sorted(calls) == [("a", 1), ("a", 2), ("b", 1)]
+    dead = queue.dead_letters()
+    assert [(job.id, job.attempts, job.last_error) for job in dead] == [("a", 2, "texto ilegible")]
+    assert queue.stats() == {"pending": 0, "leased": 0, "done": 1, "dead": 1}
+
+
+def test_expired_lease_at_max_attempts_is_dead_lettered(db_path):
+    queue = SqliteJobQueue(db_path, max_attempts=1, lease_seconds=0.2)
+    queue.add([{"id": "a"}])
+    assert queue.claim("w1") is not None
+    time.sleep(0.3)
+    assert queue.claim("w2") is None
+    assert [job.last_error for job in queue.dead_letters()] == ["Arrendamiento caducado"]
+
+
+def test_requeue_dead_letters(db_path):
+    queue = SqliteJobQueue(db_path, max_attempts=1)
+    queue.add([{"id": "a"}])
+    job = queue.claim("w1")
+    assert queue.fail(job, "error") == "dead"
+    assert queue.claim("w1") is None
+    assert queue.requeue_dead_letters() == 1
+    assert queue.dead_letters() == []
+    job = queue.claim("w1")
+    assert job.id == "a" and job.attempts == 1 and job.last_error == "error"
+    assert queue.complete(job, "ok")
+    assert queue.results() == ["ok"]
+
+
+def test_read_only_queries_do_not_take_the_write_lock(db_path):
+    queue = SqliteJobQueue(db_path, busy_timeout=0.1)
+    queue.add([{"id": "a"}])
+    other_node = sqlite3.connect(db_path, isolation_level=None)
+    other_node.execute("BEGIN IMMEDIATE")
+    try:
+        assert queue.stats()["pending"] == 1
+        assert queue.results() == []
+        assert queue.dead_letters() == []
+        with pytest.raises(sqlite3.OperationalError):
+            queue.claim("w1")
+    finally:
+        other_node.execute("ROLLBACK")
+        other_node.close()
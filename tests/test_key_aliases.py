@@ -0,0 +1,103 @@
+import json
+import types
+
+import pytest
+
+from py_openai_extractor.extractor import InfoExtractor
+from py_openai_extractor.key_aliases import KeyAliaser
+from py_openai_extractor.records import Record, RESULT_MODE_DICT, RESULT_MODE_RECORDS
+
+JSON_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "noticia",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "cargo": {"type": "string"},
+                "cargo_list": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "cargo_unit": {"type": "string"},
+                            "cargo_commodity": {"type": "string"},
+                            "cargo_quantity": {"type": "number"}
+                        },
+                        "required": ["cargo_unit", "cargo_commodity", "cargo_quantity"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["cargo", "cargo_list"],
+            "additionalProperties": False
+        }
+    }
+}
+
+EXPECTED = {"cargo": "cargo", "cargo_list": [{"cargo_unit": "cajas", "cargo_commodity": "cargo", "cargo_quantity": 12}]}
+
+EXAMPLES = 'Entrada: "12 cajas cargo"\nSalida: ' + json.dumps(EXPECTED)
+
+MESSAGES_CONFIG = {
+    "system": {"role": "system", "content": "Extrae la información."},
+    "template": {"content": "{json_template}\n{field_definitions}\n{input_example}\n<<{input_text}>>"}
+}
+
+
+def _aliaser():
+    return KeyAliaser(JSON_SCHEMA, {"cargo": "", "cargo_list": [{"cargo_unit": "", "cargo_commodity": ""}]})
+
+
+def test_alias_text_keeps_values():
+    aliaser = _aliaser()
+    aliased = aliaser.alias_text(EXAMPLES)
+    entrada, salida = aliased.split("\nSalida: ")
+    assert entrada == 'Entrada: "12 cajas cargo"'
+    assert json.loads(salida) == aliaser.alias_value(EXPECTED)
+    assert aliaser.expand(json.loads(salida)) == EXPECTED
+
+
+def test_alias_text_single_quoted_keys():
+    aliaser = _aliaser()
+    aliased = aliaser.alias_text("{'cargo': 'cargo', 'cargo_unit' : 'cargo'}")
+    assert aliased == f"{{'{aliaser.alias('cargo')}': 'cargo', '{aliaser.alias('cargo_unit')}' : 'cargo'}}"
+
+
+class _AliasedCompletions:
+    # Responde como lo haría el modelo: con las claves cortas que aparecen en el esquema recibido
+    def __init__(self):
+        self.requests = []
+
+    def create(self, model, messages, response_format=None, **kwargs):
+        self.requests.append({"messages": messages, "response_format": response_format})
+        content = json.dumps(_aliaser().alias_value(EXPECTED))
+        message = types.SimpleNamespace(content=content, parsed=None)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+
+@pytest.mark.parametrize("result_mode", [RESULT_MODE_DICT, RESULT_MODE_RECORDS])
+def test_aliased_round_trip(result_mode):
+    completions = _AliasedCompletions()
+    extractor = InfoExtractor().set_model("gpt-4o-mini").set_json_schema(JSON_SCHEMA)
+    extractor.set_messages_config(MESSAGES_CONFIG).set_examples(EXAMPLES)
+    extractor.set_json_template({"cargo": "", "cargo_list": [{"cargo_unit": "", "cargo_commodity": ""}]})
+    extractor.set_field_definitions({"cargo": "Descripción del cargamento", "cargo_unit": "Unidad, p. ej. \"cajas\""})
+    extractor.set_result_mode(result_mode).set_key_aliasing()
+    extractor._client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+
+    resp = extractor.extraer_informacion("12 cajas cargo")
+
+    aliaser = _aliaser()
+    request = completions.requests[0]
+    properties = request["response_format"]["json_schema"]["schema"]["properties"]
+    assert set(properties) == {aliaser.alias("cargo"), aliaser.alias("cargo_list")}
+    prompt = request["messages"][-1]["content"]
+    assert '"cargo_commodity": "cargo"' not in prompt
+    assert f'"{aliaser.alias("cargo_commodity")}": "cargo"' in prompt
+    assert resp["status"] == 0
+    assert resp["content"] == EXPECTED
+    if result_mode == RESULT_MODE_RECORDS:
+        assert isinstance(resp["content"], Record)
+        assert isinstance(resp["content"]["cargo_list"][0], Record)
@@ -0,0 +1,101 @@
+import json
+import re
+import types
+
+from py_openai_extractor.extractor import InfoExtractor
+
+JSON_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "noticia",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"ship_name": {"type": "string"}},
+            "required": ["ship_name"],
+            "additionalProperties": False
+        }
+    }
+}
+
+MESSAGES_CONFIG = {
+    "system": {"role": "system", "content": "Extrae la información."},
+    "template": {"content": "{json_template}\n{field_definitions}\n{input_example}\n<<{input_text}>>"}
+}
+
+
+def _response(content):
+    message = types.SimpleNamespace(content=content, parsed=None)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+
+class _PackingCompletions:
+    # Contesta a las peticiones empaquetadas con fn_items(ids, textos) y a las individuales con el propio texto
+    def __init__(self, fn_items):
+        self._fn_items = fn_items
+        self.requests = []
+
+    def create(self, model, messages, response_format=None, **kwargs):
+        content = messages[-1]["content"]
+        input_text = content[content.index("<<") + 2:content.rindex(">>")]
+        if response_format["json_schema"]["name"].endswith("_batch"):
+            pairs = re.findall(r"\[(\d+)\]\n(.*)", input_text)
+            self.requests.append([texto for _, texto in pairs])
+            return _response(self._fn_items([item_id for item_id, _ in pairs], [texto for _, texto in pairs]))
+        self.requests.append(input_text)
+        return _response(json.dumps({"ship_name": input_text}))
+
+
+def _extractor(fn_items, model_config=None, **packing):
+    completions = _PackingCompletions(fn_items)
+    extractor = InfoExtractor().set_model("gpt-4o-mini").set_json_schema(JSON_SCHEMA)
+    extractor.set_messages_config(MESSAGES_CONFIG).set_json_template({"ship_name": ""})
+    extractor.set_model_config(model_config or {}).set_packing(1000, **packing)
+    extractor._client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    return extractor, completions
+
+
+def _all_items(ids, textos):
+    return json.dumps({"items": [{"item_id": i, "result": {"ship_name": t}} for i, t in zip(ids, textos)]})
+
+
+def test_only_missing_or_malformed_items_are_retried():
+    def items(ids, textos):
+        return json.dumps({"items": [
+            {"item_id": ids[0], "result": {"ship_name": textos[0]}},
+            {"item_id": ids[2], "result": {"ship_name": textos[2]}},
+            {"item_id": ids[3], "result": "sin datos"},
+        ]})
+
+    extractor, completions = _extractor(items)
+    textos = ["Rosa", "Carmen", "Pilar", "Lola"]
+    resps = extractor.extraer_informacion_lote(textos)
+    assert [r["content"] for r in resps] == [{"ship_name": t} for t in textos]
+    assert completions.requests == [textos, "Carmen", "Lola"]
+
+
+def test_truncated_batch_is_split_before_retrying_individually():
+    def items(ids, textos):
+        # Una respuesta con más de dos elementos se corta al llegar a max_tokens
+        content = _all_items(ids, textos)
+        return content if len(ids) <= 2 else content[:len(content) // 2]
+
+    extractor, completions = _extractor(items)
+    textos = ["Rosa", "Carmen", "Pilar", "Lola", "Paz"]
+    resps = extractor.extraer_informacion_lote(textos)
+    assert [r["content"] for r in resps] == [{"ship_name": t} for t in textos]
+    assert completions.requests == [textos, ["Rosa", "Carmen"], ["Pilar", "Lola", "Paz"], ["Lola", "Paz"], "Pilar"]
+
+
+def test_groups_fit_in_max_tokens():
+    extractor, completions = _extractor(_all_items, {"max_tokens": 250}, output_tokens_per_item=100)
+    textos = ["Rosa", "Carmen", "Pilar", "Lola", "Paz"]
+    extractor.extraer_informacion_lote(textos)
+    assert completions.requests == [["Rosa", "Carmen"], ["Pilar", "Lola"], "Paz"]
+
+
+def test_output_estimate_from_json_template():
+    extractor, completions = _extractor(_all_items, {"max_tokens": 10000}, max_items=20)
+    assert extractor._packing_output_limit() == 20
+    extractor.set_model_config({"max_tokens": 60})
+    assert 1 <= extractor._packing_output_limit() < 20